@@ -0,0 +1,352 @@
+import io
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from combined_v2 import (AllocationResultCache, MaintenanceStore, MaintenanceViewCache, ShippingResourceAllocator, SQLiteStorage,
+                         assemble_context, azure_openai_query, azure_openai_stream, build_maintenance_charts,
+                         build_preventive_schedule, chunk_text, estimate_tokens, extract_chunks, generate_random_data,
+                         generate_random_maintenance_data, generate_sensor_data, iter_generated_chunks,
+                         SensorStream, write_parquet_chunks)
+from mock_openai_server import MockOpenAIHandler, start_mock_server
+
+
+def make_allocator_data(num_employees, num_vessels, num_voyages, seed=42):
+    rng = random.Random(seed)
+    skills = ['navigation', 'cargo_handling', 'safety_training', 'engine_maintenance',
+              'hazardous_materials', 'medical_training', 'communication']
+    employees = []
+    for i in range(num_employees):
+        employees.append({
+            'employee_id': 100 + i,
+            'name': f"Employee {i}",
+            'position': 'Deckhand',
+            'skills': {s: rng.randint(1, 5) for s in rng.sample(skills, rng.randint(2, 5))},
+            'daily_cost': rng.randint(200, 400)
+        })
+    vessels = [{
+        'vessel_id': 10000 + i,
+        'name': f"Vessel {i}",
+        'type': rng.choice(['Container Ship', 'Tanker', 'Bulk Carrier', 'Ro-Ro']),
+        'capacity': rng.randint(5000, 50000)
+    } for i in range(num_vessels)]
+    base_date = datetime(2025, 1, 1)
+    voyages = []
+    for i in range(num_voyages):
+        start_date = base_date + timedelta(days=rng.randint(0, 80))
+        end_date = start_date + timedelta(days=rng.randint(7, 21))
+        voyages.append({
+            'voyage_id': 20000 + i,
+            'vessel_id': rng.choice(vessels)['vessel_id'],
+            'route': 'Benchmark',
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d')
+        })
+    return pd.DataFrame(employees), pd.DataFrame(vessels), pd.DataFrame(voyages)
+
+
+def bench_model_build(sizes=((250, 25), (500, 50), (1000, 100), (2000, 200)), num_vessels=50):
+    start_date, end_date = pd.Timestamp(2025, 1, 1), pd.Timestamp(2025, 4, 1)
+    print("employees  voyages  variables  build_s  us/var")
+    for num_employees, num_voyages in sizes:
+        allocator = ShippingResourceAllocator()
+        allocator.load_data(*make_allocator_data(num_employees, num_vessels, num_voyages))
+        t0 = time.perf_counter()
+        solver, assignments = allocator._build_model(allocator.voyages, start_date, end_date)
+        elapsed = time.perf_counter() - t0
+        print(f"{num_employees:9d}  {num_voyages:7d}  {len(assignments):9d}  {elapsed:7.2f}  "
+              f"{1e6 * elapsed / max(len(assignments), 1):6.2f}")
+
+
+def bench_objective_coefficients(num_employees=2000, num_voyages=200, num_vessels=50):
+    allocator = ShippingResourceAllocator()
+    allocator.load_data(*make_allocator_data(num_employees, num_vessels, num_voyages))
+    t0 = time.perf_counter()
+    for e in allocator.employees:
+        for v in allocator.voyages:
+            vessel = allocator.vessel_index[v['vessel_id']]
+            allocator._calculate_skill_match(e, vessel['type']) - 0.1 * e['daily_cost'] * (v['end_date'] - v['start_date']).days
+    loop_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    allocator._objective_coefficients(allocator.voyages)
+    vectorized_s = time.perf_counter() - t0
+    print(f"{num_employees}x{num_voyages} coefficients: per-pair {loop_s * 1000:.1f} ms, "
+          f"vectorized {vectorized_s * 1000:.1f} ms")
+
+
+def bench_answer_latency(runs=5):
+    server, endpoint = start_mock_server()
+    try:
+        blocking = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            azure_openai_query("When is the ballast pump inspected?", "context", "mock-key", endpoint)
+            blocking.append(time.perf_counter() - t0)
+        ttft, total = [], []
+        for _ in range(runs):
+            stats = {}
+            "".join(azure_openai_stream("When is the ballast pump inspected?", "context", "mock-key", endpoint, stats))
+            ttft.append(stats['ttft'])
+            total.append(stats['total'])
+        print(f"answer latency: blocking {1000 * sum(blocking) / runs:.0f} ms, "
+              f"streaming first token {1000 * sum(ttft) / runs:.0f} ms (total {1000 * sum(total) / runs:.0f} ms)")
+    finally:
+        server.shutdown()
+
+
+def bench_client_reuse(calls=20):
+    for name, call in [("blocking", azure_openai_query),
+                       ("streaming", lambda *args: "".join(azure_openai_stream(*args)))]:
+        server, endpoint = start_mock_server()
+        try:
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                answer = call("When is the ballast pump inspected?", "context", "mock-key", endpoint)
+                assert answer == MockOpenAIHandler.answer, answer
+            elapsed = time.perf_counter() - t0
+            print(f"{calls} {name} chat calls opened {server.connections} connection(s) in {elapsed:.2f}s")
+            # Every call after the first must reuse the pooled keep-alive connection
+            assert server.connections == 1, f"{name} calls opened {server.connections} connections"
+        finally:
+            server.shutdown()
+
+
+def bench_context_assembly(top_k=10, seed=42):
+    rng = random.Random(seed)
+    sentences = [f"Procedure {i}: inspect the {rng.choice(['ballast pump', 'fire main', 'steering gear', 'boiler'])} "
+                 f"every {rng.randint(1, 30)} days and log reading {rng.randint(100, 999)}." for i in range(200)]
+    chunks = chunk_text(" ".join(sentences))
+    ranked = [(chunk, f"manual.txt_chunk_{i}", 1.0 - i / len(chunks), {"filename": "manual.txt", "chunk_index": i})
+              for i, chunk in enumerate(chunks[:top_k - 2])]
+    # The same manual uploaded twice under another name
+    ranked += [(chunk, f"manual_copy.txt_chunk_{i}", 0.5 - i / len(chunks), {"filename": "manual_copy.txt", "chunk_index": i})
+               for i, chunk in enumerate(chunks[:2])]
+    naive = "\n\n".join(f"Source: {doc_id.split('_chunk_')[0]}\n{doc}" for doc, doc_id, _, _ in ranked)
+    context, stats = assemble_context(ranked)
+    recalled = sum(sentence in context for sentence in sentences if any(sentence in doc for doc, _, _, _ in ranked))
+    expected = sum(any(sentence in doc for doc, _, _, _ in ranked) for sentence in sentences)
+    print(f"context for {len(ranked)} chunks: naive {estimate_tokens(naive)} tokens, assembled {stats['tokens']} tokens "
+          f"in {stats['passages']} passages, {stats['duplicates']} duplicates dropped, "
+          f"{recalled}/{expected} sentences kept")
+
+
+def bench_extraction_memory(rows=100000, seed=42):
+    rng = random.Random(seed)
+    data = ("record_id,vessel,component,reading,notes\n" + "".join(
+        f"{i},Vessel {rng.randint(1, 50)},{rng.choice(['Engine', 'Hull', 'Pump'])},{rng.random():.4f},ok\n"
+        for i in range(rows))).encode()
+    for name, extract in [("to_string", lambda: chunk_text(pd.read_csv(io.BytesIO(data)).to_string())),
+                          ("streaming", lambda: extract_chunks("text/csv", data))]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        chunks = extract()
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{len(data) / 1e6:.1f} MB csv via {name}: {len(chunks)} chunks, peak {peak / 1e6:.1f} MB, {elapsed:.2f}s")
+
+
+def bench_storage_concurrency(threads=8, lookups=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AllocationResultCache(SQLiteStorage(os.path.join(tmp, "bench.db")))
+        errors = []
+
+        def session(n):
+            try:
+                for i in range(lookups):
+                    key = f"{n}-{i % 20}"
+                    if cache.get(key) is None:
+                        cache.put(key, {"status": "OPTIMAL", "allocations": {i: [n, i]}})
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=session, args=(n,)) for n in range(threads)]
+        t0 = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - t0
+        print(f"{threads} sessions x {lookups} cache lookups: {threads * lookups / elapsed:.0f} ops/s, "
+              f"{len(errors)} lock errors")
+
+
+def bench_file_listing(num_files=50000, page_size=50):
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, "bench.db"))
+        with storage.transaction() as conn:
+            conn.executemany("INSERT INTO files (filename) VALUES (?)",
+                             [(f"vessel_{i % 500:03d}_manual_rev{i}.pdf",) for i in range(num_files)])
+        conn = storage.connection()
+        t0 = time.perf_counter()
+        conn.execute("SELECT filename FROM files").fetchall()
+        full_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        total = storage.count_files("_042_")
+        storage.list_files("_042_", limit=page_size)
+        search_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        conn.execute("SELECT filename FROM files WHERE filename LIKE '%\\_042\\_%' ESCAPE '\\'").fetchall()
+        scan_s = time.perf_counter() - t0
+        print(f"{num_files} files: full listing {1000 * full_s:.1f} ms, indexed search page ({total} matches) "
+              f"{1000 * search_s:.1f} ms, LIKE scan {1000 * scan_s:.1f} ms")
+
+
+def make_maintenance_data(num_records, seed=42):
+    rng = np.random.default_rng(seed)
+    last = pd.Timestamp(2025, 1, 1) + pd.to_timedelta(rng.integers(0, 365, num_records), unit="D")
+    return pd.DataFrame({
+        'Ship': rng.choice(['Titanic', 'Queen Mary', 'Black Pearl', 'Flying Dutchman', 'SS Minnow'], num_records),
+        'Component': rng.choice(['Engine', 'Propeller', 'Navigation System', 'Hull', 'Electrical System',
+                                 'Fuel System', 'Cooling System', 'Deck Equipment', 'Safety Equipment'], num_records),
+        'Maintenance Type': rng.choice(['Preventive', 'Corrective', 'Predictive', 'Condition-based'], num_records),
+        'Last Maintenance Date': last,
+        'Next Maintenance Date': last + pd.to_timedelta(rng.integers(30, 365, num_records), unit="D"),
+        'Status': rng.choice(['Completed', 'Pending', 'Overdue', 'Cancelled'], num_records),
+        'Cost ($)': rng.uniform(100, 10000, num_records).round(2),
+        'Hours Spent': rng.integers(1, 49, num_records)
+    })
+
+
+def bench_maintenance_filters(num_records=200000, inserts=20):
+    data = make_maintenance_data(num_records)
+    filters = {'Ship': 'Titanic', 'Component': 'Engine', 'Status': None, 'Maintenance Type': None}
+    t0 = time.perf_counter()
+    filtered = data.copy()
+    for column, value in filters.items():
+        if value is not None:
+            filtered = filtered[filtered[column] == value]
+    kpis = (len(filtered), len(filtered[filtered['Maintenance Type'] == 'Preventive']),
+            len(filtered[filtered['Status'] == 'Overdue']), filtered['Cost ($)'].sum(),
+            filtered['Maintenance Type'].value_counts(), filtered.groupby('Component')['Cost ($)'].sum())
+    filtered.sort_values('Next Maintenance Date', ascending=False)
+    masks_s = time.perf_counter() - t0
+    record = data.iloc[0].to_dict()
+    t0 = time.perf_counter()
+    for _ in range(inserts):
+        data = pd.concat([data, pd.DataFrame([record])], ignore_index=True)
+    concat_s = (time.perf_counter() - t0) / inserts
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MaintenanceStore(SQLiteStorage(os.path.join(tmp, "bench.db")))
+        t0 = time.perf_counter()
+        store.extend(make_maintenance_data(num_records))
+        load_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        summary = store.summary(filters)
+        kpi_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        store.rows(filters)
+        rows_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(inserts):
+            store.add(record)
+        insert_s = (time.perf_counter() - t0) / inserts
+    assert summary['total'] == kpis[0]
+    print(f"{num_records} maintenance rows, one filter click: masks {1000 * masks_s:.0f} ms; "
+          f"SQLite KPIs {1000 * kpi_s:.1f} ms + rows {1000 * rows_s:.0f} ms (one-off load {load_s:.1f} s); "
+          f"add record: concat {1000 * concat_s:.1f} ms, insert {1000 * insert_s:.2f} ms")
+
+
+def bench_maintenance_view_cache(num_records=50000, reruns=20):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MaintenanceStore(SQLiteStorage(os.path.join(tmp, "bench.db")))
+        store.extend(make_maintenance_data(num_records))
+        view_cache = MaintenanceViewCache()
+        filters = {'Ship': 'Titanic', 'Component': None, 'Status': None, 'Maintenance Type': None}
+
+        def rerun(cache):
+            view_key = (tuple(filters.items()), store.version())
+            summary = cache.get(('summary', view_key), lambda: store.summary(filters))
+            cache.get(('rows', view_key), lambda: store.rows(filters))
+            cache.get(('charts', view_key), lambda: build_maintenance_charts(summary))
+            cache.get(('schedule', view_key, 2025, 6), lambda: build_preventive_schedule(store, filters, 2025, 6))
+
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            rerun(MaintenanceViewCache())
+        cold_s = (time.perf_counter() - t0) / reruns
+        rerun(view_cache)
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            rerun(view_cache)
+        warm_s = (time.perf_counter() - t0) / reruns
+    print(f"{num_records} maintenance rows, dashboard rerun: recomputed {1000 * cold_s:.0f} ms, "
+          f"cached {1000 * warm_s:.2f} ms ({view_cache.hits} hits, {view_cache.misses} misses)")
+
+
+def bench_data_generators(num_records=1000000, parquet_records=10000000, chunk_size=1000000):
+    for generator in (generate_random_maintenance_data, generate_sensor_data):
+        t0 = time.perf_counter()
+        generator(num_records, seed=42)
+        elapsed = time.perf_counter() - t0
+        print(f"{generator.__name__}: {num_records / elapsed / 1e6:.1f}M rows/s")
+    t0 = time.perf_counter()
+    generate_random_data(num_records // 10, 1000, num_records // 10, seed=42)
+    elapsed = time.perf_counter() - t0
+    print(f"generate_random_data: {num_records // 10 / elapsed / 1e3:.0f}k employees+voyages/s")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sensor_data.parquet")
+        t0 = time.perf_counter()
+        rows = write_parquet_chunks(iter_generated_chunks(generate_sensor_data, parquet_records, chunk_size, seed=42), path)
+        elapsed = time.perf_counter() - t0
+        print(f"{rows} sensor rows to Parquet in {chunk_size}-row chunks: {elapsed:.1f} s "
+              f"({rows / elapsed / 1e6:.1f}M rows/s, {os.path.getsize(path) / 1e6:.0f} MB)")
+
+
+def bench_sensor_stream(num_readings=200000, reruns=20):
+    data = generate_sensor_data(num_readings, seed=42)
+    t0 = time.perf_counter()
+    for _ in range(reruns):
+        alerts = data[data['Alert'] == True].sort_values('Timestamp', ascending=False)
+    scan_s = (time.perf_counter() - t0) / reruns
+    stream = SensorStream()
+    readings = list(data.sort_values('Timestamp').itertuples(index=False, name=None))
+    t0 = time.perf_counter()
+    for timestamp, component, parameter, value, _, _ in readings:
+        stream.ingest(timestamp, component, parameter, value)
+    ingest_s = (time.perf_counter() - t0) / num_readings
+    stream.alert_frame()
+    t0 = time.perf_counter()
+    for _ in range(reruns):
+        stream.alert_frame()
+    snapshot_s = (time.perf_counter() - t0) / reruns
+    print(f"{num_readings} sensor readings ({len(alerts)} over threshold): full-scan alert filter {1000 * scan_s:.1f} ms/rerun; "
+          f"streaming ingest {1e6 * ingest_s:.1f} us/reading, alert snapshot {1000 * snapshot_s:.3f} ms/rerun")
+
+
+def bench_startup(runs=3):
+    heavy = ['chromadb', 'sentence_transformers', 'nltk', 'openai', 'ortools', 'plotly', 'PyPDF2', 'docx']
+    code = ("import sys, time; t0 = time.perf_counter(); import combined_v2; elapsed = time.perf_counter() - t0; "
+            f"print(elapsed, ','.join(m for m in {heavy!r} if m in sys.modules))")
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+        timings.append(float(output[0]))
+    loaded = output[1] if len(output) > 1 else "none"
+    print(f"cold import of combined_v2: {1000 * min(timings):.0f} ms (best of {runs}), heavy modules loaded: {loaded}")
+
+
+if __name__ == "__main__":
+    bench_startup()
+    bench_model_build()
+    bench_objective_coefficients()
+    bench_answer_latency()
+    bench_client_reuse()
+    bench_context_assembly()
+    bench_extraction_memory()
+    bench_storage_concurrency()
+    bench_file_listing()
+    bench_maintenance_filters()
+    bench_maintenance_view_cache()
+    bench_data_generators()
+    bench_sensor_stream()
@@ -1,55 +1,873 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
-from docx import Document
 import json
+import csv
 import os
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-import chromadb
-from sentence_transformers import SentenceTransformer
-import nltk
-from nltk.tokenize import word_tokenize
-from rank_bm25 import BM25Okapi
 import re
-from ortools.linear_solver import pywraplp
+import io
+import queue
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta, date
-from collections import defaultdict
+from collections import defaultdict, Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from ast import literal_eval
-import random
 import numpy as np
-import plotly.express as px
 import calendar
-from PyPDF2 import PdfReader
-
-# Initial NLTK setup
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
 
 # First Application Setup (Contextual RAG Q&A)
 load_dotenv()
 ADMIN_CREDENTIALS = {"admin_id": "admin", "password": "admin123"}
-conn = sqlite3.connect('files.db', check_same_thread=False)
-c = conn.cursor()
-c.execute('''CREATE TABLE IF NOT EXISTS files
-             (id INTEGER PRIMARY KEY AUTOINCREMENT,
-              filename TEXT UNIQUE,
-              content TEXT,
-              uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-conn.commit()
-chroma_client = chromadb.PersistentClient(path="chroma_db")
-collection = chroma_client.get_or_create_collection(name="documents")
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")
+AZURE_OPENAI_TIMEOUT = float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+AZURE_OPENAI_CONNECT_TIMEOUT = float(os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", "5"))
+AZURE_OPENAI_MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "3"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+class SQLiteStorage:
+    # One connection per thread in WAL mode, so sessions read while ingestion writes
+    def __init__(self, db_path='files.db', timeout=30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.local = threading.local()
+        with self.transaction() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS files
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             filename TEXT UNIQUE,
+                             uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS file_contents
+                            (file_id INTEGER PRIMARY KEY REFERENCES files (id) ON DELETE CASCADE,
+                             content TEXT)''')
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+            if 'content' in columns:
+                # Older databases kept the text in the listing table
+                conn.execute("INSERT OR REPLACE INTO file_contents (file_id, content) SELECT id, content FROM files")
+                conn.execute("ALTER TABLE files DROP COLUMN content")
+            # Trigram full-text index so filename search matches any substring without scanning the table
+            indexed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_fts'").fetchone()
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(filename, content='files', "
+                         "content_rowid='id', tokenize='trigram')")
+            conn.execute('''CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+                                INSERT INTO files_fts (rowid, filename) VALUES (new.id, new.filename);
+                            END''')
+            conn.execute('''CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+                                INSERT INTO files_fts (files_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+                            END''')
+            conn.execute('''CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF filename ON files BEGIN
+                                INSERT INTO files_fts (files_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+                                INSERT INTO files_fts (rowid, filename) VALUES (new.id, new.filename);
+                            END''')
+            if not indexed:
+                conn.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+    
+    def connection(self):
+        conn = getattr(self.local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.local.connection = conn
+        return conn
+    
+    @contextmanager
+    def transaction(self, immediate=True):
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    
+    def _file_filter(self, search):
+        if not search:
+            return "", ()
+        if len(search) >= 3:
+            # A quoted trigram phrase matches the literal substring, case-insensitively
+            return ("WHERE id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)",
+                    ('"' + search.replace('"', '""') + '"',))
+        # Shorter than one trigram, so the index cannot help
+        return "WHERE instr(lower(filename), lower(?)) > 0", (search,)
+    
+    def count_files(self, search=""):
+        where, params = self._file_filter(search)
+        return self.connection().execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+    
+    def list_files(self, search="", limit=50, offset=0):
+        where, params = self._file_filter(search)
+        return pd.read_sql_query(f"SELECT filename AS Filename, uploaded_at AS \"Uploaded at\" FROM files {where} "
+                                 f"ORDER BY id DESC LIMIT ? OFFSET ?", self.connection(), params=(*params, limit, offset))
+
+# Heavy resources are created on first use so the allocator and maintenance apps start without them
+@st.cache_resource
+def get_storage():
+    return SQLiteStorage()
+
+@st.cache_resource
+def get_collection():
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path="chroma_db")
+    return chroma_client.get_or_create_collection(name="documents")
+
+@st.cache_resource
+def get_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+@st.cache_resource
+def get_word_tokenizer():
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt')
+    from nltk.tokenize import word_tokenize
+    return word_tokenize
+
+SPREADSHEET_TYPES = ("text/csv", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+def iter_text_blocks(file_type, data, block_size=64 * 1024):
+    file = io.BytesIO(data)
+    if file_type == "application/pdf":
+        from PyPDF2 import PdfReader
+        for page in PdfReader(file).pages:
+            yield (page.extract_text() or "") + "\n"
+    elif file_type in ("text/plain", "text/markdown"):
+        reader = io.TextIOWrapper(file, encoding="utf-8")
+        while block := reader.read(block_size):
+            yield block
+    elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        from docx import Document
+        for para in Document(file).paragraphs:
+            yield para.text + "\n"
+    elif file_type == "application/json":
+        yield from json.JSONEncoder(indent=4).iterencode(json.load(file))
+
+def iter_records(file_type, data):
+    file = io.BytesIO(data)
+    if file_type == "text/csv":
+        yield from csv.reader(io.TextIOWrapper(file, encoding="utf-8", newline=""))
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield ["" if value is None else str(value) for value in row]
+        finally:
+            workbook.close()
+
+def iter_chunks(blocks, chunk_size=1000, overlap=200):
+    # Yields exactly what chunk_text would for "".join(blocks) while only buffering about one block
+    buffer, pending, pending_length = "", [], 0
+    for block in blocks:
+        pending.append(block)
+        pending_length += len(block)
+        if pending_length < chunk_size:
+            continue
+        buffer += "".join(pending)
+        pending, pending_length = [], 0
+        start = 0
+        while len(buffer) - start > chunk_size:
+            end = start + chunk_size
+            last_period = max(buffer.rfind('.', start, end), buffer.rfind('\n', start, end))
+            if last_period > start + chunk_size // 2:
+                end = last_period + 1
+            yield buffer[start:end]
+            start = end - overlap
+        buffer = buffer[start:]
+    text = buffer + "".join(pending)
+    start = 0
+    text_length = len(text)
+    while start < text_length:
+        end = min(start + chunk_size, text_length)
+        if end < text_length and end - start == chunk_size:
+            last_period = max(text.rfind('.', start, end), text.rfind('\n', start, end))
+            if last_period > start + chunk_size // 2: 
+                end = last_period + 1
+        yield text[start:end]
+        start = end - overlap if end < text_length else text_length
+
+def chunk_text(text, chunk_size=1000, overlap=200):
+    return list(iter_chunks([text], chunk_size, overlap))
+
+def _format_record(record):
+    line = io.StringIO()
+    csv.writer(line).writerow(record)
+    return line.getvalue().rstrip("\r\n")
+
+def chunk_records(records, chunk_size=1000):
+    # Spreadsheet chunks hold whole rows only and each repeats the header so records stay self-describing
+    header = None
+    lines, length = [], 0
+    for record in records:
+        if not any(value.strip() for value in record):
+            continue
+        line = _format_record(record)
+        if header is None:
+            header = line
+            continue
+        if lines and len(header) + length + len(line) + 1 > chunk_size:
+            yield header + "\n" + "\n".join(lines)
+            lines, length = [], 0
+        lines.append(line)
+        length += len(line) + 1
+    if lines:
+        yield header + "\n" + "\n".join(lines)
+    elif header is not None:
+        yield header
+
+def extract_chunks(file_type, data):
+    if file_type in SPREADSHEET_TYPES:
+        return list(chunk_records(iter_records(file_type, data)))
+    return list(iter_chunks(iter_text_blocks(file_type, data)))
+
+def join_chunks(chunks, overlap=200):
+    parts = []
+    for i, chunk in enumerate(chunks):
+        if i and overlap and chunk.startswith(chunks[i - 1][-overlap:]):
+            parts.append(chunk[overlap:])
+        else:
+            parts.append(("\n" if i else "") + chunk)
+    return "".join(parts)
+
+def preprocess_text(text):
+    text = re.sub(r'[^\w\s]', '', text.lower())
+    return get_word_tokenizer()(text)
+
+def estimate_tokens(text):
+    # GPT-4 class tokenizers average about four characters per token on English prose
+    return (len(text) + 3) // 4
+
+def _shingles(text, size=5):
+    words = re.findall(r'\w+', text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+def _merge_overlap(left, right, max_overlap):
+    # Consecutive text chunks share exactly max_overlap characters; spreadsheet chunks share none, so any
+    # shorter match would be a coincidence
+    if max_overlap and len(right) > max_overlap and left.endswith(right[:max_overlap]):
+        return left + right[max_overlap:]
+    return left + "\n" + right
+
+def _render_context(selected, max_overlap):
+    by_file = defaultdict(list)
+    for (filename, index), (doc, score) in selected.items():
+        by_file[filename].append((index, doc, score))
+    spans = []
+    for filename, chunks in by_file.items():
+        chunks.sort(key=lambda chunk: (chunk[0] is None, chunk[0] if chunk[0] is not None else 0))
+        for index, doc, score in chunks:
+            last = spans[-1] if spans else None
+            if last and last['filename'] == filename and index is not None and last['last'] == index - 1:
+                last['text'] = _merge_overlap(last['text'], doc, max_overlap)
+                last['last'] = index
+                last['score'] = max(last['score'], score)
+            else:
+                spans.append({'filename': filename, 'first': index, 'last': index, 'text': doc, 'score': score})
+    spans.sort(key=lambda span: span['score'], reverse=True)
+    context_chunks = []
+    for span in spans:
+        if span['first'] is None:
+            location = ""
+        elif span['first'] == span['last']:
+            location = f", chunk {span['first']}"
+        else:
+            location = f", chunks {span['first']}-{span['last']}"
+        metadata = f"Source: {span['filename']}{location} (Score: {span['score']:.3f})"
+        context_chunks.append(f"{metadata}\n{span['text']}")
+    return "\n\n" + "-"*50 + "\n\n".join(context_chunks), len(spans)
+
+def assemble_context(ranked_docs, token_budget=CONTEXT_TOKEN_BUDGET, max_overlap=200, duplicate_threshold=0.8):
+    # ranked_docs holds (document, chunk id, score, metadata); adjacent chunks of a file are stitched back
+    # together without their overlap, and near-duplicates of already selected text are dropped
+    selected = {}
+    shingles = {}
+    stats = {'chunks': len(ranked_docs), 'selected': 0, 'duplicates': 0, 'over_budget': 0}
+    context, spans = "", 0
+    for doc, doc_id, score, metadata in sorted(ranked_docs, key=lambda item: item[2], reverse=True):
+        filename = metadata.get('filename', doc_id.split('_chunk_')[0])
+        index = metadata.get('chunk_index')
+        key = (filename, index)
+        if key in selected:
+            continue
+        doc_shingles = _shingles(doc)
+        neighbours = {(filename, index - 1), (filename, index + 1)} if index is not None else set()
+        if any(len(doc_shingles & kept) >= duplicate_threshold * len(doc_shingles)
+               for other, kept in shingles.items() if other not in neighbours):
+            stats['duplicates'] += 1
+            continue
+        selected[key] = (doc, score)
+        candidate, candidate_spans = _render_context(selected, max_overlap)
+        if estimate_tokens(candidate) > token_budget:
+            del selected[key]
+            stats['over_budget'] += 1
+            continue
+        shingles[key] = doc_shingles
+        context, spans = candidate, candidate_spans
+    if not selected and ranked_docs:
+        # Never send an empty context when even the best chunk alone exceeds the budget
+        doc, doc_id, score, metadata = max(ranked_docs, key=lambda item: item[2])
+        selected[(metadata.get('filename', doc_id.split('_chunk_')[0]), metadata.get('chunk_index'))] = (
+            doc[:token_budget * 4], score)
+        context, spans = _render_context(selected, max_overlap)
+    stats['selected'] = len(selected)
+    stats['passages'] = spans
+    stats['tokens'] = estimate_tokens(context)
+    return context, stats
+
+class BM25Index:
+    def __init__(self, storage, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.storage = storage
+        storage.connection().executescript('''
+                CREATE TABLE IF NOT EXISTS bm25_docs
+                    (chunk_id TEXT PRIMARY KEY,
+                     filename TEXT,
+                     length INTEGER);
+                CREATE INDEX IF NOT EXISTS idx_bm25_docs_filename ON bm25_docs (filename);
+                CREATE TABLE IF NOT EXISTS bm25_terms
+                    (term TEXT PRIMARY KEY,
+                     df INTEGER) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS bm25_postings
+                    (term TEXT,
+                     chunk_id TEXT,
+                     tf INTEGER,
+                     PRIMARY KEY (term, chunk_id)) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_bm25_postings_chunk ON bm25_postings (chunk_id);
+                CREATE TABLE IF NOT EXISTS bm25_stats
+                    (id INTEGER PRIMARY KEY CHECK (id = 0),
+                     doc_count INTEGER,
+                     total_length INTEGER);
+                INSERT OR IGNORE INTO bm25_stats (id, doc_count, total_length) VALUES (0, 0, 0);
+            ''')
+    
+    def doc_count(self):
+        return self.storage.connection().execute("SELECT doc_count FROM bm25_stats WHERE id = 0").fetchone()[0]
+    
+    def add(self, chunk_ids, filenames, documents):
+        docs, postings, df = [], [], Counter()
+        for chunk_id, filename, document in zip(chunk_ids, filenames, documents):
+            tokens = preprocess_text(document)
+            docs.append((chunk_id, filename, len(tokens)))
+            for term, tf in Counter(tokens).items():
+                postings.append((term, chunk_id, tf))
+                df[term] += 1
+        with self.storage.transaction() as conn:
+            conn.executemany("INSERT INTO bm25_docs (chunk_id, filename, length) VALUES (?, ?, ?)", docs)
+            conn.executemany("INSERT INTO bm25_postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+            conn.executemany("INSERT INTO bm25_terms (term, df) VALUES (?, ?) "
+                             "ON CONFLICT(term) DO UPDATE SET df = df + excluded.df", df.items())
+            conn.execute("UPDATE bm25_stats SET doc_count = doc_count + ?, total_length = total_length + ? "
+                         "WHERE id = 0", (len(docs), sum(length for _, _, length in docs)))
+    
+    def remove_file(self, filename):
+        self._remove("SELECT chunk_id FROM bm25_docs WHERE filename = ?", (filename,))
+    
+    def remove_chunks(self, chunk_ids, batch_size=500):
+        for start in range(0, len(chunk_ids), batch_size):
+            batch = list(chunk_ids[start:start + batch_size])
+            self._remove(f"SELECT chunk_id FROM bm25_docs WHERE chunk_id IN ({', '.join('?' * len(batch))})", batch)
+    
+    def _remove(self, chunk_query, params):
+        with self.storage.transaction() as conn:
+            count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM bm25_docs "
+                                        f"WHERE chunk_id IN ({chunk_query})", params).fetchone()
+            if not count:
+                return
+            term_counts = conn.execute(f'''SELECT term, COUNT(*) FROM bm25_postings
+                                           WHERE chunk_id IN ({chunk_query})
+                                           GROUP BY term''', params).fetchall()
+            conn.executemany("UPDATE bm25_terms SET df = df - ? WHERE term = ?",
+                             [(n, term) for term, n in term_counts])
+            conn.execute("DELETE FROM bm25_terms WHERE df <= 0")
+            conn.execute(f"DELETE FROM bm25_postings WHERE chunk_id IN ({chunk_query})", params)
+            conn.execute(f"DELETE FROM bm25_docs WHERE chunk_id IN ({chunk_query})", params)
+            conn.execute("UPDATE bm25_stats SET doc_count = doc_count - ?, total_length = total_length - ? "
+                         "WHERE id = 0", (count, total))
+    
+    def rebuild_from_collection(self, collection, batch_size=1000):
+        offset = 0
+        while True:
+            batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                break
+            self.add(batch["ids"], [m.get("filename") for m in batch["metadatas"]], batch["documents"])
+            offset += len(batch["ids"])
+    
+    def scores(self, query_terms):
+        terms = sorted(set(query_terms))
+        if not terms:
+            return {}
+        placeholders = ", ".join("?" * len(terms))
+        # A read transaction keeps the stats and postings from the same snapshot
+        with self.storage.transaction(immediate=False) as conn:
+            doc_count, total_length = conn.execute(
+                "SELECT doc_count, total_length FROM bm25_stats WHERE id = 0").fetchone()
+            rows = conn.execute(f'''SELECT p.chunk_id, p.tf, d.length, t.df
+                                    FROM bm25_postings p
+                                    JOIN bm25_docs d ON d.chunk_id = p.chunk_id
+                                    JOIN bm25_terms t ON t.term = p.term
+                                    WHERE p.term IN ({placeholders})''', terms).fetchall()
+        if not rows or not doc_count:
+            return {}
+        chunk_ids = [row[0] for row in rows]
+        tf, length, df = (np.array([row[i] for row in rows], dtype=float) for i in (1, 2, 3))
+        idf = np.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        avgdl = total_length / doc_count
+        term_scores = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avgdl))
+        totals = defaultdict(float)
+        for chunk_id, score in zip(chunk_ids, term_scores.tolist()):
+            totals[chunk_id] += score
+        return dict(totals)
+
+@st.cache_resource
+def get_bm25_index():
+    index = BM25Index(get_storage())
+    collection = get_collection()
+    if index.doc_count() == 0 and collection.count() > 0:
+        index.rebuild_from_collection(collection)
+    return index
+
+class QueryCache:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.embeddings = OrderedDict()
+        self.results = OrderedDict()
+        self.version = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+    
+    def _get(self, store, key):
+        with self.lock:
+            if key not in store:
+                return None
+            store.move_to_end(key)
+            return store[key]
+    
+    def _put(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+    
+    def get_embedding(self, query):
+        return self._get(self.embeddings, self.normalize(query))
+    
+    def put_embedding(self, query, embedding):
+        with self.lock:
+            self._put(self.embeddings, self.normalize(query), embedding)
+    
+    def get_results(self, query, top_k):
+        return self._get(self.results, (self.normalize(query), top_k))
+    
+    def put_results(self, query, top_k, ranked, version):
+        with self.lock:
+            # Skip results computed against a corpus that has changed since
+            if version == self.version:
+                self._put(self.results, (self.normalize(query), top_k), ranked)
+    
+    def invalidate(self):
+        with self.lock:
+            self.results.clear()
+            self.version += 1
+
+@st.cache_resource
+def get_query_cache():
+    return QueryCache()
+
+class IngestionQueue:
+    ACTIVE_STATUSES = ('parsing', 'embedding')
+
+    def __init__(self, storage, max_parse_workers=None, batch_size=EMBEDDING_BATCH_SIZE, bm25_index=None,
+                 query_cache=None):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.bm25_index = bm25_index
+        self.query_cache = query_cache
+        self.parse_pool = ProcessPoolExecutor(max_workers=max_parse_workers)
+        self.parsed = queue.Queue()
+        # Chunk hashes per file position, and one embedding per distinct chunk text shared by every file
+        storage.connection().executescript('''
+            CREATE TABLE IF NOT EXISTS ingestion_jobs
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 filename TEXT,
+                 status TEXT,
+                 total_chunks INTEGER DEFAULT 0,
+                 embedded_chunks INTEGER DEFAULT 0,
+                 reused_chunks INTEGER DEFAULT 0,
+                 chunks_per_sec REAL,
+                 error TEXT,
+                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs (status);
+            CREATE TABLE IF NOT EXISTS file_chunks
+                (filename TEXT,
+                 chunk_index INTEGER,
+                 content_hash TEXT,
+                 PRIMARY KEY (filename, chunk_index)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_file_chunks_hash ON file_chunks (content_hash);
+            CREATE TABLE IF NOT EXISTS chunk_embeddings
+                (content_hash TEXT PRIMARY KEY,
+                 embedding BLOB) WITHOUT ROWID;
+        ''')
+        with storage.transaction() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ingestion_jobs)")}
+            if 'reused_chunks' not in columns:
+                conn.execute("ALTER TABLE ingestion_jobs ADD COLUMN reused_chunks INTEGER DEFAULT 0")
+            # Jobs left running by a previous process lost their in-memory payload
+            conn.execute("UPDATE ingestion_jobs SET status = 'interrupted' WHERE status IN (?, ?)", self.ACTIVE_STATUSES)
+        self.embedder = threading.Thread(target=self._embed_loop, name="ingestion-embedder", daemon=True)
+        self.embedder.start()
+    
+    def submit(self, files):
+        files = list(files)
+        with self.storage.transaction() as conn:
+            job_ids = [conn.execute("INSERT INTO ingestion_jobs (filename, status) VALUES (?, 'parsing')",
+                                    (filename,)).lastrowid for filename, _, _ in files]
+        for job_id, (filename, file_type, data) in zip(job_ids, files):
+            future = self.parse_pool.submit(extract_chunks, file_type, data)
+            future.add_done_callback(lambda f, job_id=job_id, filename=filename: self.parsed.put((job_id, filename, f)))
+    
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.storage.transaction() as conn:
+            conn.execute(f"UPDATE ingestion_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (*fields.values(), job_id))
+    
+    def _embed_loop(self):
+        while True:
+            items = [self.parsed.get()]
+            while True:
+                try:
+                    items.append(self.parsed.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._embed(items)
+            except Exception as e:
+                for job_id, _, _ in items:
+                    self._update(job_id, status='failed', error=str(e))
+    
+    def _embed(self, items):
+        documents, ids, metadatas, hashes, owners = [], [], [], [], []
+        replaced = set()
+        jobs = {}
+        for job_id, filename, future in items:
+            try:
+                chunks = future.result()
+            except Exception as e:
+                self._update(job_id, status='failed', error=f"Extraction failed: {e}")
+                continue
+            chunk_hashes = [hashlib.sha256(chunk.encode('utf-8')).hexdigest() for chunk in chunks]
+            conn = self.storage.connection()
+            row = conn.execute("SELECT id FROM files WHERE filename = ?", (filename,)).fetchone()
+            previous = dict(conn.execute("SELECT chunk_index, content_hash FROM file_chunks WHERE filename = ?",
+                                         (filename,)).fetchall())
+            if row is not None and previous == dict(enumerate(chunk_hashes)):
+                self._update(job_id, status='skipped', error=f"'{filename}' is unchanged.")
+                continue
+            changed = [i for i, h in enumerate(chunk_hashes) if previous.get(i) != h]
+            self._update(job_id, status='embedding', total_chunks=len(changed), reused_chunks=len(chunks) - len(changed))
+            if row is not None and not previous:
+                # Indexed before chunk hashes were recorded, so nothing can be matched up
+                self._drop_from_indexes(filename)
+            replaced.update(f"{filename}_chunk_{i}" for i in changed if i in previous)
+            jobs[job_id] = (filename, chunks, chunk_hashes, previous, row is not None)
+            for i in changed:
+                documents.append(chunks[i])
+                ids.append(f"{filename}_chunk_{i}")
+                metadatas.append({"filename": filename, "chunk_index": i})
+                hashes.append(chunk_hashes[i])
+                owners.append(job_id)
+        collection = get_collection()
+        start_time = time.perf_counter()
+        try:
+            for start in range(0, len(documents), self.batch_size):
+                batch = slice(start, start + self.batch_size)
+                embeddings, reused, new = self._embeddings_for(documents[batch], hashes[batch])
+                collection.upsert(documents=documents[batch], embeddings=embeddings, ids=ids[batch], metadatas=metadatas[batch])
+                counts = Counter(owners[batch])
+                hits = Counter(owner for owner, hit in zip(owners[batch], reused) if hit)
+                # One write transaction per batch for the embedding store, the BM25 postings and progress
+                with self.storage.transaction() as conn:
+                    conn.executemany("INSERT OR IGNORE INTO chunk_embeddings (content_hash, embedding) VALUES (?, ?)",
+                                     [(h, vector.tobytes()) for h, vector in new.items()])
+                    if self.bm25_index is not None:
+                        # Old postings go in the same transaction that writes their replacements
+                        self.bm25_index.remove_chunks([chunk_id for chunk_id in ids[batch] if chunk_id in replaced])
+                        self.bm25_index.add(ids[batch], [m["filename"] for m in metadatas[batch]], documents[batch])
+                    conn.executemany("UPDATE ingestion_jobs SET embedded_chunks = embedded_chunks + ?, "
+                                     "reused_chunks = reused_chunks + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                                     [(count, hits[job_id], job_id) for job_id, count in counts.items()])
+            # File rows and chunk hashes are only recorded once every chunk is indexed, so an interrupted
+            # or failed upload is never mistaken for an unchanged one
+            stale = []
+            with self.storage.transaction() as conn:
+                for filename, chunks, chunk_hashes, previous, exists in jobs.values():
+                    if exists:
+                        conn.execute("UPDATE files SET uploaded_at = CURRENT_TIMESTAMP WHERE filename = ?", (filename,))
+                    else:
+                        conn.execute("INSERT INTO files (filename) VALUES (?)", (filename,))
+                    conn.execute("INSERT OR REPLACE INTO file_contents (file_id, content) "
+                                 "SELECT id, ? FROM files WHERE filename = ?", (join_chunks(chunks), filename))
+                    conn.execute("DELETE FROM file_chunks WHERE filename = ?", (filename,))
+                    conn.executemany("INSERT INTO file_chunks (filename, chunk_index, content_hash) VALUES (?, ?, ?)",
+                                     [(filename, i, h) for i, h in enumerate(chunk_hashes)])
+                    stale.extend(f"{filename}_chunk_{i}" for i in previous if i >= len(chunks))
+            if stale:
+                collection.delete(ids=stale)
+                if self.bm25_index is not None:
+                    self.bm25_index.remove_chunks(stale)
+        except Exception:
+            # Earlier batches may already have overwritten an existing file's chunks, so its hashes no longer
+            # describe the index; dropping them makes the next upload re-index the whole file. A brand new
+            # file has nothing to fall back to, so its partial chunks are dropped
+            with self.storage.transaction() as conn:
+                conn.executemany("DELETE FROM file_chunks WHERE filename = ?",
+                                 [(filename,) for filename, _, _, _, exists in jobs.values() if exists])
+            for filename, _, _, _, exists in jobs.values():
+                if not exists:
+                    self._drop_from_indexes(filename)
+            raise
+        finally:
+            if jobs:
+                self._prune_embeddings()
+                if self.query_cache is not None:
+                    self.query_cache.invalidate()
+        throughput = len(documents) / max(time.perf_counter() - start_time, 1e-9)
+        with self.storage.transaction():
+            for job_id in jobs:
+                self._update(job_id, status='done', chunks_per_sec=throughput)
+    
+    def _embeddings_for(self, documents, hashes):
+        unique = list(set(hashes))
+        rows = self.storage.connection().execute(f"SELECT content_hash, embedding FROM chunk_embeddings "
+                                                 f"WHERE content_hash IN ({', '.join('?' * len(unique))})", unique).fetchall()
+        stored = {content_hash: np.frombuffer(blob, dtype=np.float32) for content_hash, blob in rows}
+        missing = {h: doc for h, doc in zip(hashes, documents) if h not in stored}
+        reused = [h in stored for h in hashes]
+        new = {}
+        if missing:
+            encoded = get_embedding_model().encode(list(missing.values()), batch_size=self.batch_size)
+            new = {h: np.asarray(vector, dtype=np.float32) for h, vector in zip(missing, encoded)}
+            stored.update(new)
+        return [stored[h].tolist() for h in hashes], reused, new
+    
+    def _prune_embeddings(self):
+        with self.storage.transaction() as conn:
+            conn.execute("DELETE FROM chunk_embeddings WHERE content_hash NOT IN (SELECT content_hash FROM file_chunks)")
+    
+    def _delete_rows(self, filenames):
+        with self.storage.transaction() as conn:
+            conn.executemany("DELETE FROM files WHERE filename = ?", [(f,) for f in filenames])
+            conn.executemany("DELETE FROM file_chunks WHERE filename = ?", [(f,) for f in filenames])
+    
+    def _drop_from_indexes(self, filename):
+        if self.bm25_index is not None:
+            self.bm25_index.remove_file(filename)
+        get_collection().delete(where={"filename": filename})
+    
+    def remove_files(self, filenames, batch_size=500):
+        filenames = list(filenames)
+        chunk_ids, indexed = [], set()
+        with self.storage.transaction() as conn:
+            for start in range(0, len(filenames), batch_size):
+                batch = filenames[start:start + batch_size]
+                rows = conn.execute(f"SELECT filename, chunk_index FROM file_chunks WHERE filename IN "
+                                    f"({', '.join('?' * len(batch))})", batch).fetchall()
+                chunk_ids.extend(f"{filename}_chunk_{i}" for filename, i in rows)
+                indexed.update(filename for filename, _ in rows)
+            self._delete_rows(filenames)
+        self._prune_embeddings()
+        collection = get_collection()
+        if chunk_ids:
+            collection.delete(ids=chunk_ids)
+        if self.bm25_index is not None:
+            self.bm25_index.remove_chunks(chunk_ids)
+        # Files indexed before chunk ids were recorded can only be found by metadata
+        legacy = [filename for filename in filenames if filename not in indexed]
+        if legacy:
+            collection.delete(where={"filename": {"$in": legacy}})
+            if self.bm25_index is not None:
+                for filename in legacy:
+                    self.bm25_index.remove_file(filename)
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+    
+    def remove_file(self, filename):
+        self.remove_files([filename])
+    
+    def jobs(self, limit=50):
+        return pd.read_sql_query("SELECT id, filename, status, total_chunks, embedded_chunks, reused_chunks, chunks_per_sec, error, "
+                                 "created_at, updated_at FROM ingestion_jobs ORDER BY id DESC LIMIT ?",
+                                 self.storage.connection(), params=(limit,))
+
+@st.cache_resource
+def get_ingestion_queue():
+    return IngestionQueue(get_storage(), bm25_index=get_bm25_index(), query_cache=get_query_cache())
+
+def build_chat_messages(question, context):
+    system_prompt = """
+        You are an AI assistant tasked with performing comprehensive extraction of information from ALL provided context chunks.
+        When responding to a user's question, adhere strictly to the following guidelines:
+        - Review EVERY context chunk provided thoroughly, ensuring you cover ALL occurrences of relevant information.
+        - Extract and list EVERY relevant piece of information explicitly and separately, even if the same or similar information appears multiple times or across different chunks.
+        - Do NOT stop after partial matches or the initial findings; CONTINUE reviewing ALL chunks until no additional relevant information remains.
+        - Clearly format your responses in a structured manner (e.g., bullet points or numbered lists) for readability.
+        Provide explicit source citations indicating:
+        - The exact document filename.
+        - The specific chunk or page number from which each piece of information was extracted.
+        Your goal is complete accuracy and exhaustive retrieval—no relevant data should be omitted.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}\nAnswer:"}
+    ]
+
+CHAT_COMPLETION_PARAMS = {
+    "model": "gpt-4o",
+    "temperature": 0.7,
+    "max_tokens": 1000,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0
+}
+
+@st.cache_resource
+def get_azure_openai_client(endpoint, api_key, api_version=AZURE_OPENAI_API_VERSION):
+    from openai import AzureOpenAI, Timeout
+    # One client per (endpoint, key, version) keeps its keep-alive connection pool across questions;
+    # max_retries uses the SDK's exponential backoff on 429/5xx and connection errors
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        timeout=Timeout(AZURE_OPENAI_TIMEOUT, connect=AZURE_OPENAI_CONNECT_TIMEOUT),
+        max_retries=AZURE_OPENAI_MAX_RETRIES
+    )
+
+class LatencyStats:
+    def __init__(self, window=500):
+        self.stats = defaultdict(lambda: {'count': 0, 'total': 0.0, 'min': None, 'max': 0.0, 'last': 0.0})
+        # Recent samples per call type for percentiles; counts and means cover every call
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.lock = threading.Lock()
+    
+    def record(self, name, seconds):
+        with self.lock:
+            entry = self.stats[name]
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['min'] = seconds if entry['min'] is None else min(entry['min'], seconds)
+            entry['max'] = max(entry['max'], seconds)
+            entry['last'] = seconds
+            self.samples[name].append(seconds)
+    
+    def summary(self):
+        with self.lock:
+            return {name: {**entry, 'mean': entry['total'] / entry['count'],
+                           'p95': float(np.percentile(self.samples[name], 95))} for name, entry in self.stats.items()}
+
+@st.cache_resource
+def get_latency_stats():
+    return LatencyStats()
+
+def azure_openai_query(question, context, api_key, endpoint):
+    client = get_azure_openai_client(endpoint, api_key)
+    start_time = time.perf_counter()
+    response = client.chat.completions.create(messages=build_chat_messages(question, context), **CHAT_COMPLETION_PARAMS)
+    get_latency_stats().record('completion', time.perf_counter() - start_time)
+    return response.choices[0].message.content.strip()
+
+def azure_openai_stream(question, context, api_key, endpoint, stats=None):
+    client = get_azure_openai_client(endpoint, api_key)
+    latency = get_latency_stats()
+    stats = {} if stats is None else stats
+    start_time = time.perf_counter()
+    with client.chat.completions.with_streaming_response.create(messages=build_chat_messages(question, context),
+                                                                 stream=True, **CHAT_COMPLETION_PARAMS) as response:
+        # The SDK's Stream closes the response at [DONE], before the end of the chunked body, which discards
+        # the connection; reading every line ourselves lets it go back to the keep-alive pool
+        for line in response.iter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            chunk = json.loads(line[len("data: "):])
+            if chunk.get('error'):
+                raise RuntimeError(chunk['error'].get('message') or "An error occurred during streaming")
+            # Azure sends content-filter chunks with no choices
+            choices = chunk.get('choices')
+            content = choices[0].get('delta', {}).get('content') if choices else None
+            if not content:
+                continue
+            if 'ttft' not in stats:
+                stats['ttft'] = time.perf_counter() - start_time
+                latency.record('first_token', stats['ttft'])
+            yield content
+    stats['total'] = time.perf_counter() - start_time
+    latency.record('stream', stats['total'])
 
 # Second Application Setup (Shipping Resource Allocator)
 class ShippingResourceAllocator:
-    def __init__(self):
+    AVAILABILITY_MODES = ('cliques', 'daily')
+    SOLVER_BACKENDS = {'scip': 'SCIP', 'cp-sat': 'CP_SAT'}
+    PARALLEL_MIN_VARIABLES = 20000
+    DEFAULT_ELIGIBILITY_RULES = {
+        'staffed_vessel_types_only': True,
+        'require_skill': False,
+        'positions': {},
+        'certifications': {},
+        'match_home_port': False
+    }
+
+    def __init__(self, availability_mode='cliques', eligibility_rules=None, decompose=True, max_workers=None,
+                 backend='scip', time_limit=None, relative_gap=None, num_search_workers=None):
+        if availability_mode not in self.AVAILABILITY_MODES:
+            raise ValueError(f"Unknown availability mode: {availability_mode}")
+        if backend not in self.SOLVER_BACKENDS:
+            raise ValueError(f"Unknown solver backend: {backend}")
+        unknown_rules = set(eligibility_rules or {}) - set(self.DEFAULT_ELIGIBILITY_RULES)
+        if unknown_rules:
+            raise ValueError(f"Unknown eligibility rules: {', '.join(sorted(unknown_rules))}")
+        self.availability_mode = availability_mode
+        self.eligibility_rules = {**self.DEFAULT_ELIGIBILITY_RULES, **(eligibility_rules or {})}
+        self.pruning_stats = {}
+        self.decompose = decompose
+        self.max_workers = max_workers
+        self.backend = backend
+        self.time_limit = time_limit
+        self.relative_gap = relative_gap
+        self.num_search_workers = num_search_workers
         self.employees = []
         self.vessels = []
         self.voyages = []
         self.skill_requirements = {}
+        self.employee_index = {}
+        self.vessel_index = {}
+        self.voyage_index = {}
+        self.voyage_requirements = {}
+        self.voyage_types = {}
+        self.skill_holders = {}
+        self.skill_names = []
+        self.skill_matrix = np.zeros((0, 0))
+        self.vessel_types = []
+        self.requirement_matrix = np.zeros((0, 0))
+        self.skill_score_matrix = np.zeros((0, 0))
+        self.skill_coverage = np.zeros((0, 0), dtype=bool)
+        self.daily_costs = np.zeros(0)
         
     def load_data(self, employees_data, vessels_data, voyages_data):
         try:
@@ -68,11 +886,30 @@ class ShippingResourceAllocator:
             if not all(['voyage_id' in v for v in self.voyages]):
                 raise ValueError("Voyage data missing voyage_id")
             self._process_skill_requirements()
+            self._build_indexes()
+            self._build_skill_matrices()
             return True
         except Exception as e:
             st.error(f"Error loading data: {str(e)}")
             return False
     
+    def cache_key(self, employees_data, vessels_data, voyages_data, start_date, end_date):
+        self._process_skill_requirements()
+        digest = hashlib.sha256()
+        for frame in (employees_data, vessels_data, voyages_data):
+            digest.update(frame.to_json(orient='split', date_format='iso', default_handler=str).encode('utf-8'))
+        settings = {
+            'skill_requirements': self.skill_requirements,
+            'dates': [str(self._to_timestamp(start_date)), str(self._to_timestamp(end_date))],
+            'availability_mode': self.availability_mode,
+            'eligibility_rules': self.eligibility_rules,
+            'backend': self.backend,
+            'time_limit': self.time_limit,
+            'relative_gap': self.relative_gap
+        }
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+    
     def _parse_skills(self, skills_data):
         if isinstance(skills_data, dict):
             return skills_data
@@ -106,61 +943,354 @@ class ShippingResourceAllocator:
             }
         }
     
+    def _build_indexes(self):
+        self.employee_index = {e['employee_id']: e for e in self.employees}
+        self.vessel_index = {v['vessel_id']: v for v in self.vessels}
+        self.voyage_index = {v['voyage_id']: v for v in self.voyages}
+        self.voyage_requirements = {}
+        self.voyage_types = {}
+        for v in self.voyages:
+            vessel = self.vessel_index.get(v['vessel_id'])
+            if not vessel or not vessel.get('type'):
+                continue
+            self.voyage_types[v['voyage_id']] = vessel['type']
+            self.voyage_requirements[v['voyage_id']] = self.skill_requirements.get(vessel['type'], {})
+    
+    def _build_skill_matrices(self):
+        required = {skill for req in self.skill_requirements.values() for skill in req.get('required_skills', {})}
+        self.skill_names = sorted(required | {skill for e in self.employees for skill in e['skills']})
+        skill_col = {skill: j for j, skill in enumerate(self.skill_names)}
+        self.skill_matrix = np.zeros((len(self.employees), len(self.skill_names)))
+        for i, e in enumerate(self.employees):
+            for skill, level in e['skills'].items():
+                self.skill_matrix[i, skill_col[skill]] = float(level)
+        self.vessel_types = list(self.skill_requirements)
+        self.requirement_matrix = np.zeros((len(self.vessel_types), len(self.skill_names)))
+        required_mask = np.zeros(self.requirement_matrix.shape, dtype=bool)
+        for t, vessel_type in enumerate(self.vessel_types):
+            for skill, min_level in self.skill_requirements[vessel_type]['required_skills'].items():
+                self.requirement_matrix[t, skill_col[skill]] = min_level
+                required_mask[t, skill_col[skill]] = True
+        # employees x types x skills, mirroring _calculate_skill_match
+        levels = self.skill_matrix[:, None, :]
+        minimums = self.requirement_matrix[None, :, :]
+        counted = (levels >= 1) & required_mask[None, :, :]
+        per_skill = np.minimum(levels, minimums) + 0.5 * np.maximum(levels - minimums, 0)
+        self.skill_score_matrix = np.where(counted, per_skill, 0).sum(axis=2)
+        self.skill_coverage = counted.any(axis=2)
+        self.daily_costs = np.array([float(e.get('daily_cost', 0)) for e in self.employees])
+        employee_ids = np.array([e['employee_id'] for e in self.employees])
+        self.skill_holders = {}
+        for skill in required:
+            column = self.skill_matrix[:, skill_col[skill]]
+            holders = np.flatnonzero(column >= 1)
+            self.skill_holders[skill] = list(zip(employee_ids[holders].tolist(), column[holders].tolist()))
+    
+    def _objective_coefficients(self, voyages):
+        type_row = {vessel_type: t for t, vessel_type in enumerate(self.vessel_types)}
+        durations = np.array([(v['end_date'] - v['start_date']).days for v in voyages], dtype=float)
+        coefficients = -0.1 * np.outer(self.daily_costs, durations)
+        for j, v in enumerate(voyages):
+            t = type_row.get(self.voyage_types.get(v['voyage_id']))
+            if t is not None:
+                coefficients[:, j] += self.skill_score_matrix[:, t]
+        return coefficients
+    
+    def _parse_certifications(self, certifications):
+        if isinstance(certifications, (list, tuple, set)):
+            return {str(c).strip() for c in certifications}
+        if isinstance(certifications, str) and certifications.strip():
+            try:
+                parsed = literal_eval(certifications)
+                if isinstance(parsed, (list, tuple, set)):
+                    return {str(c).strip() for c in parsed}
+            except (ValueError, SyntaxError):
+                pass
+            return {c.strip() for c in certifications.split(',') if c.strip()}
+        return set()
+    
+    def _eligibility_mask(self, voyages, blocked_pairs=None):
+        rules = self.eligibility_rules
+        type_row = {vessel_type: t for t, vessel_type in enumerate(self.vessel_types)}
+        eligible = np.ones((len(self.employees), len(voyages)), dtype=bool)
+        removed = defaultdict(int)
+        
+        def prune(rule, mask):
+            dropped = eligible & ~mask
+            removed[rule] += int(dropped.sum())
+            eligible[dropped] = False
+        
+        voyage_type_rows = [type_row.get(self.voyage_types.get(v['voyage_id'])) for v in voyages]
+        if rules['staffed_vessel_types_only']:
+            staffed = np.array([t is not None for t in voyage_type_rows], dtype=bool)
+            prune('staffed_vessel_types_only', np.broadcast_to(staffed, eligible.shape))
+        if rules['require_skill']:
+            columns = [self.skill_coverage[:, t] if t is not None else np.zeros(len(self.employees), dtype=bool)
+                       for t in voyage_type_rows]
+            prune('require_skill', np.column_stack(columns) if columns else eligible)
+        if rules['positions']:
+            positions = np.array([e.get('position') for e in self.employees], dtype=object)
+            mask = np.ones_like(eligible)
+            for j, v in enumerate(voyages):
+                allowed = rules['positions'].get(self.voyage_types.get(v['voyage_id']))
+                if allowed is not None:
+                    mask[:, j] = np.isin(positions, list(allowed))
+            prune('positions', mask)
+        if rules['certifications']:
+            held = [self._parse_certifications(e.get('certifications')) for e in self.employees]
+            mask = np.ones_like(eligible)
+            certified = {}
+            for j, v in enumerate(voyages):
+                vessel_type = self.voyage_types.get(v['voyage_id'])
+                needed = rules['certifications'].get(vessel_type)
+                if not needed:
+                    continue
+                if vessel_type not in certified:
+                    certified[vessel_type] = np.array([set(needed) <= h for h in held], dtype=bool)
+                mask[:, j] = certified[vessel_type]
+            prune('certifications', mask)
+        if rules['match_home_port']:
+            home_ports = [e.get('home_port') for e in self.employees]
+            mask = np.ones_like(eligible)
+            for j, v in enumerate(voyages):
+                origin = str(v.get('route', '')).split(' to ')[0].strip()
+                mask[:, j] = [not isinstance(p, str) or not p or p == origin for p in home_ports]
+            prune('match_home_port', mask)
+        if blocked_pairs:
+            voyage_col = {v['voyage_id']: j for j, v in enumerate(voyages)}
+            mask = np.ones_like(eligible)
+            for i, e in enumerate(self.employees):
+                for v_id in blocked_pairs.get(e['employee_id'], ()):
+                    if v_id in voyage_col:
+                        mask[i, voyage_col[v_id]] = False
+            prune('committed_elsewhere', mask)
+        self.pruning_stats = {
+            'candidate_variables': eligible.size,
+            'pruned_variables': eligible.size - int(eligible.sum()),
+            'pruned_by_rule': dict(removed)
+        }
+        return eligible
+    
     def _get_employee_skill_level(self, employee, skill):
         return float(employee['skills'].get(skill, 0))
     
-    def optimize_allocation(self, start_date, end_date):
+    def _to_timestamp(self, value):
+        if isinstance(value, (str, date)):
+            return pd.to_datetime(value)
+        return value
+    
+    def _relevant_voyages(self, start_date, end_date):
+        return [
+            v for v in self.voyages 
+            if not (v['end_date'] < start_date or v['start_date'] > end_date)
+        ]
+    
+    def optimize_allocation(self, start_date, end_date, hint=None):
         try:
-            if isinstance(start_date, str):
-                start_date = pd.to_datetime(start_date)
-            elif isinstance(start_date, date):
-                start_date = pd.to_datetime(start_date)
-            if isinstance(end_date, str):
-                end_date = pd.to_datetime(end_date)
-            elif isinstance(end_date, date):
-                end_date = pd.to_datetime(end_date)
-            relevant_voyages = [
-                v for v in self.voyages 
-                if not (v['end_date'] < start_date or v['start_date'] > end_date)
-            ]
+            start_date = self._to_timestamp(start_date)
+            end_date = self._to_timestamp(end_date)
+            relevant_voyages = self._relevant_voyages(start_date, end_date)
             if not relevant_voyages:
                 return {"status": "No voyages in specified period"}
-            solver = pywraplp.Solver.CreateSolver('SCIP')
-            if not solver:
-                return {"status": "Failed to create solver"}
-            assignments = {}
-            for e in self.employees:
-                for v in relevant_voyages:
-                    assignments[(e['employee_id'], v['voyage_id'])] = solver.IntVar(
-                        0, 1, f"x_{e['employee_id']}_{v['voyage_id']}")
-            objective = solver.Objective()
-            for (e_id, v_id), var in assignments.items():
-                employee = next((e for e in self.employees if e['employee_id'] == e_id), None)
-                voyage = next((v for v in relevant_voyages if v['voyage_id'] == v_id), None)
-                if not employee or not voyage:
-                    continue
-                vessel = next((v for v in self.vessels if v['vessel_id'] == voyage['vessel_id']), None)
-                if not vessel:
+            hinted_pairs = None
+            if isinstance(hint, dict) and hint.get('allocations'):
+                hinted_pairs = {(e_id, v_id) for v_id, e_ids in hint['allocations'].items() for e_id in e_ids}
+            components = [relevant_voyages]
+            if self.decompose:
+                components = self._overlap_components(relevant_voyages, start_date, end_date)
+            workers = min(len(components), os.cpu_count() or 1, self.max_workers or len(components))
+            # Worker processes fork the whole app, so they only pay off for models big enough to outweigh that
+            if workers <= 1 or len(self.employees) * len(relevant_voyages) < self.PARALLEL_MIN_VARIABLES:
+                solved = [_solve_allocation_component(self, component, start_date, end_date, hinted_pairs)
+                          for component in components]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_allocation_worker,
+                                         initargs=(self,)) as pool:
+                    n = len(components)
+                    solved = list(pool.map(_solve_allocation_component, [None] * n, components,
+                                           [start_date] * n, [end_date] * n, [hinted_pairs] * n))
+            return self._merge_component_results(solved)
+        except Exception as e:
+            return {"status": f"Optimization failed: {str(e)}"}
+    
+    def reoptimize(self, previous_result, start_date, end_date, add_employees=None, remove_employees=None,
+                   voyage_dates=None, reopen_overlapping=False):
+        try:
+            start_date = self._to_timestamp(start_date)
+            end_date = self._to_timestamp(end_date)
+            removed = set(remove_employees or [])
+            added = []
+            if removed:
+                self.employees = [e for e in self.employees if e['employee_id'] not in removed]
+            if add_employees is not None:
+                added = add_employees.to_dict('records') if isinstance(add_employees, pd.DataFrame) else list(add_employees)
+                for employee in added:
+                    employee['skills'] = self._parse_skills(employee.get('skills', {}))
+                self.employees.extend(added)
+            changed = set()
+            for v_id, (new_start, new_end) in (voyage_dates or {}).items():
+                voyage = self.voyage_index.get(v_id)
+                if not voyage:
                     continue
-                skill_score = self._calculate_skill_match(employee, vessel['type'])
-                cost = employee.get('daily_cost', 0) * (voyage['end_date'] - voyage['start_date']).days
-                objective.SetCoefficient(var, skill_score - 0.1 * cost)
-            objective.SetMaximization()
-            self._add_availability_constraints(solver, assignments, relevant_voyages, start_date, end_date)
-            self._add_crew_size_constraints(solver, assignments, relevant_voyages)
-            self._add_skill_constraints(solver, assignments, relevant_voyages)
-            status = solver.Solve()
-            if status == pywraplp.Solver.OPTIMAL:
-                return self._prepare_results(assignments, relevant_voyages)
-            return {"status": f"No optimal solution found (status: {status})"}
+                voyage['start_date'] = pd.to_datetime(new_start)
+                voyage['end_date'] = pd.to_datetime(new_end)
+                changed.add(v_id)
+            self._build_indexes()
+            self._build_skill_matrices()
+            if not isinstance(previous_result, dict) or previous_result.get('status') not in ('OPTIMAL', 'FEASIBLE'):
+                # Nothing to warm-start from, so solve the updated data from scratch
+                return self.optimize_allocation(start_date, end_date)
+            relevant_voyages = self._relevant_voyages(start_date, end_date)
+            if not relevant_voyages:
+                return {"status": "No voyages in specified period"}
+            previous = previous_result.get('allocations', {})
+            touched = set(changed)
+            for v in relevant_voyages:
+                if removed.intersection(previous.get(v['voyage_id'], [])):
+                    touched.add(v['voyage_id'])
+            if added:
+                # New hires can only improve voyages they are eligible for
+                added_ids = {e['employee_id'] for e in added}
+                rows = [i for i, e in enumerate(self.employees) if e['employee_id'] in added_ids]
+                eligible = self._eligibility_mask(relevant_voyages)[rows].any(axis=0)
+                touched.update(v['voyage_id'] for v, ok in zip(relevant_voyages, eligible) if ok)
+            spans = {v['voyage_id']: (first, last) for first, last, v in
+                     self._window_day_spans(relevant_voyages, start_date, end_date)}
+            
+            def overlaps(a, b):
+                (a_first, a_last), (b_first, b_last) = spans[a], spans[b]
+                return a_first <= a_last and b_first <= b_last and a_first <= b_last and b_first <= a_last
+            
+            affected = {v['voyage_id'] for v in relevant_voyages if v['voyage_id'] in touched}
+            if reopen_overlapping:
+                # Let crews on voyages sharing a day with a touched voyage swap as well
+                affected |= {v['voyage_id'] for v in relevant_voyages
+                             if any(overlaps(v['voyage_id'], t) for t in touched if t in spans)}
+            fixed = {v['voyage_id']: previous[v['voyage_id']] for v in relevant_voyages
+                     if v['voyage_id'] not in affected and previous.get(v['voyage_id'])}
+            if not affected:
+                return {**previous_result, "allocations": fixed, "total_assignments": sum(len(c) for c in fixed.values()),
+                        "reoptimized_voyages": 0}
+            blocked = defaultdict(set)
+            for fixed_id, crew in fixed.items():
+                for a_id in affected:
+                    if overlaps(fixed_id, a_id):
+                        for e_id in crew:
+                            blocked[e_id].add(a_id)
+            hinted_pairs = {(e_id, v_id) for v_id, e_ids in previous.items() for e_id in e_ids}
+            affected_voyages = [v for v in relevant_voyages if v['voyage_id'] in affected]
+            result = self._solve_voyages(affected_voyages, start_date, end_date, hinted_pairs, blocked)
+            if result.get('status') not in ('OPTIMAL', 'FEASIBLE'):
+                return self.optimize_allocation(start_date, end_date, hint=previous_result)
+            allocations = {**fixed, **result['allocations']}
+            return {
+                **result,
+                "total_assignments": sum(len(c) for c in allocations.values()),
+                "allocations": allocations,
+                "reoptimized_voyages": len(affected)
+            }
         except Exception as e:
             return {"status": f"Optimization failed: {str(e)}"}
     
+    def _solve_voyages(self, voyages, start_date, end_date, hinted_pairs=None, blocked_pairs=None):
+        from ortools.linear_solver import pywraplp
+        solver, assignments = self._build_model(voyages, start_date, end_date, blocked_pairs)
+        if not solver:
+            return {"status": "Failed to create solver"}
+        if self.time_limit:
+            solver.SetTimeLimit(int(self.time_limit * 1000))
+        params = pywraplp.MPSolverParameters()
+        if self.backend == 'cp-sat':
+            sat_params = []
+            if self.relative_gap is not None:
+                sat_params.append(f"relative_gap_limit:{self.relative_gap}")
+            if self.num_search_workers:
+                sat_params.append(f"num_workers:{self.num_search_workers}")
+            if sat_params:
+                solver.SetSolverSpecificParametersAsString(" ".join(sat_params))
+        else:
+            if self.num_search_workers:
+                solver.SetNumThreads(self.num_search_workers)
+            if self.relative_gap is not None:
+                params.SetDoubleParam(pywraplp.MPSolverParameters.RELATIVE_MIP_GAP, self.relative_gap)
+        if hinted_pairs is not None and assignments:
+            solver.SetHint(list(assignments.values()), [1.0 if pair in hinted_pairs else 0.0 for pair in assignments])
+        status = solver.Solve(params)
+        if status == pywraplp.Solver.OPTIMAL:
+            return self._prepare_results(assignments, voyages)
+        if status == pywraplp.Solver.FEASIBLE:
+            return self._prepare_results(assignments, voyages, status="FEASIBLE")
+        return {"status": f"No optimal solution found (status: {status})"}
+    
+    def _merge_component_results(self, solved):
+        allocations = {}
+        total_assignments = 0
+        stats = {'candidate_variables': 0, 'pruned_variables': 0, 'pruned_by_rule': defaultdict(int)}
+        status = "OPTIMAL"
+        for result, pruning_stats in solved:
+            if result.get('status') not in ('OPTIMAL', 'FEASIBLE'):
+                return result
+            if result['status'] == 'FEASIBLE':
+                status = "FEASIBLE"
+            allocations.update(result['allocations'])
+            total_assignments += result['total_assignments']
+            stats['candidate_variables'] += pruning_stats.get('candidate_variables', 0)
+            stats['pruned_variables'] += pruning_stats.get('pruned_variables', 0)
+            for rule, count in pruning_stats.get('pruned_by_rule', {}).items():
+                stats['pruned_by_rule'][rule] += count
+        stats['pruned_by_rule'] = dict(stats['pruned_by_rule'])
+        self.pruning_stats = stats
+        return {
+            "status": status,
+            "total_assignments": total_assignments,
+            "allocations": allocations,
+            "pruned_variables": stats['pruned_variables'],
+            "components": len(solved)
+        }
+    
+    def _build_model(self, voyages, start_date, end_date, blocked_pairs=None):
+        from ortools.linear_solver import pywraplp
+        solver = pywraplp.Solver.CreateSolver(self.SOLVER_BACKENDS[self.backend])
+        if not solver:
+            return None, {}
+        assignments = {}
+        eligible = self._eligibility_mask(voyages, blocked_pairs)
+        for i, e in enumerate(self.employees):
+            for j, v in enumerate(voyages):
+                if eligible[i, j]:
+                    assignments[(e['employee_id'], v['voyage_id'])] = solver.IntVar(
+                        0, 1, f"x_{e['employee_id']}_{v['voyage_id']}")
+        objective = solver.Objective()
+        coefficients = self._objective_coefficients(voyages)
+        for j, v in enumerate(voyages):
+            if v['vessel_id'] not in self.vessel_index:
+                continue
+            for i, e in enumerate(self.employees):
+                var = assignments.get((e['employee_id'], v['voyage_id']))
+                if var:
+                    objective.SetCoefficient(var, float(coefficients[i, j]))
+        objective.SetMaximization()
+        self._add_availability_constraints(solver, assignments, voyages, start_date, end_date)
+        self._add_crew_size_constraints(solver, assignments, voyages)
+        self._add_skill_constraints(solver, assignments, voyages)
+        return solver, assignments
+    
     def _add_availability_constraints(self, solver, assignments, voyages, start_date, end_date):
         if isinstance(start_date, date):
             start_date = pd.to_datetime(start_date)
         if isinstance(end_date, date):
             end_date = pd.to_datetime(end_date)
+        if self.availability_mode == 'cliques':
+            for clique in self._overlap_cliques(voyages, start_date, end_date):
+                for e in self.employees:
+                    clique_vars = [assignments.get((e['employee_id'], v_id)) for v_id in clique]
+                    clique_vars = [var for var in clique_vars if var]
+                    if len(clique_vars) < 2:
+                        continue
+                    constraint = solver.Constraint(0, 1)
+                    for var in clique_vars:
+                        constraint.SetCoefficient(var, 1)
+            return
         date_range = pd.date_range(start_date, end_date)
         for e in self.employees:
             for day in date_range:
@@ -171,15 +1301,59 @@ class ShippingResourceAllocator:
                         if var:
                             constraint.SetCoefficient(var, 1)
     
-    def _add_crew_size_constraints(self, solver, assignments, voyages):
+    def _window_day_spans(self, voyages, start_date, end_date):
+        # Voyages are clipped to the planning-window days so overlaps match the daily model exactly
+        num_days = len(pd.date_range(start_date, end_date))
+        one_day = pd.Timedelta(days=1)
+        spans = []
         for v in voyages:
-            vessel = next((vsl for vsl in self.vessels if vsl['vessel_id'] == v['vessel_id']), None)
-            if not vessel:
+            first = max(0, -((start_date - v['start_date']) // one_day))
+            last = min(num_days - 1, (v['end_date'] - start_date) // one_day)
+            spans.append((first, last, v))
+        return spans
+    
+    def _overlap_cliques(self, voyages, start_date, end_date):
+        events = []
+        for first, last, v in self._window_day_spans(voyages, start_date, end_date):
+            if first > last:
                 continue
-            vessel_type = vessel.get('type')
-            if not vessel_type:
+            events.append((first, 0, v['voyage_id']))
+            events.append((last, 1, v['voyage_id']))
+        events.sort(key=lambda ev: (ev[0], ev[1]))
+        cliques = []
+        active = []
+        last_was_start = False
+        for _, kind, v_id in events:
+            if kind == 0:
+                active.append(v_id)
+                last_was_start = True
+            else:
+                if last_was_start and len(active) > 1:
+                    cliques.append(list(active))
+                active.remove(v_id)
+                last_was_start = False
+        return cliques
+    
+    def _overlap_components(self, voyages, start_date, end_date):
+        components = []
+        outside_window = []
+        component_end = None
+        for first, last, v in sorted(self._window_day_spans(voyages, start_date, end_date),
+                                     key=lambda span: span[0]):
+            if first > last:
+                outside_window.append([v])
                 continue
-            min_crew = self.skill_requirements.get(vessel_type, {}).get('min_crew', 0)
+            if component_end is not None and first <= component_end:
+                components[-1].append(v)
+                component_end = max(component_end, last)
+            else:
+                components.append([v])
+                component_end = last
+        return components + outside_window
+    
+    def _add_crew_size_constraints(self, solver, assignments, voyages):
+        for v in voyages:
+            min_crew = self.voyage_requirements.get(v['voyage_id'], {}).get('min_crew', 0)
             if min_crew <= 0:
                 continue
             constraint = solver.Constraint(min_crew, solver.infinity())
@@ -190,21 +1364,15 @@ class ShippingResourceAllocator:
     
     def _add_skill_constraints(self, solver, assignments, voyages):
         for v in voyages:
-            vessel = next((vsl for vsl in self.vessels if vsl['vessel_id'] == v['vessel_id']), None)
-            if not vessel:
+            if v['voyage_id'] not in self.voyage_requirements:
                 continue
-            vessel_type = vessel.get('type')
-            if not vessel_type:
-                continue
-            req_skills = self.skill_requirements.get(vessel_type, {}).get('required_skills', {})
+            req_skills = self.voyage_requirements[v['voyage_id']].get('required_skills', {})
             for skill, min_level in req_skills.items():
                 constraint = solver.Constraint(min_level, solver.infinity())
-                for e in self.employees:
-                    skill_level = self._get_employee_skill_level(e, skill)
-                    if skill_level >= 1:
-                        var = assignments.get((e['employee_id'], v['voyage_id']))
-                        if var:
-                            constraint.SetCoefficient(var, skill_level)
+                for e_id, skill_level in self.skill_holders.get(skill, []):
+                    var = assignments.get((e_id, v['voyage_id']))
+                    if var:
+                        constraint.SetCoefficient(var, skill_level)
     
     def _calculate_skill_match(self, employee, vessel_type):
         if vessel_type not in self.skill_requirements:
@@ -218,30 +1386,31 @@ class ShippingResourceAllocator:
                     total_score += (skill_level - min_level) * 0.5
         return total_score
     
-    def _prepare_results(self, assignments, voyages):
+    def _prepare_results(self, assignments, voyages, status="OPTIMAL"):
         allocation = defaultdict(list)
         for (e_id, v_id), var in assignments.items():
             if var.solution_value() > 0.5:
                 allocation[v_id].append(e_id)
         return {
-            "status": "OPTIMAL",
+            "status": status,
             "total_assignments": sum(var.solution_value() for var in assignments.values()),
-            "allocations": dict(allocation)
+            "allocations": dict(allocation),
+            "pruned_variables": self.pruning_stats.get('pruned_variables', 0)
         }
     
     def generate_report(self, allocation_result):
         if not isinstance(allocation_result, dict):
             return {"status": "Invalid allocation result format"}
-        if allocation_result.get('status') != 'OPTIMAL':
+        if allocation_result.get('status') not in ('OPTIMAL', 'FEASIBLE'):
             return {"status": f"No optimal allocation: {allocation_result.get('status', 'Unknown error')}"}
         if not allocation_result.get('allocations'):
             return {"status": "No allocations found in results"}
         report = []
         for v_id, e_ids in allocation_result['allocations'].items():
-            voyage = next((v for v in self.voyages if v['voyage_id'] == v_id), None)
+            voyage = self.voyage_index.get(v_id)
             if not voyage:
                 continue
-            vessel = next((v for v in self.vessels if v['vessel_id'] == voyage['vessel_id']), None)
+            vessel = self.vessel_index.get(voyage['vessel_id'])
             if not vessel:
                 continue
             voyage_report = {
@@ -254,7 +1423,7 @@ class ShippingResourceAllocator:
                 'crew': []
             }
             for e_id in e_ids:
-                employee = next((e for e in self.employees if e['employee_id'] == e_id), None)
+                employee = self.employee_index.get(e_id)
                 if employee:
                     voyage_report['crew'].append({
                         'id': e_id,
@@ -265,209 +1434,629 @@ class ShippingResourceAllocator:
             report.append(voyage_report)
         return report if report else {"status": "No valid voyage allocations to report"}
 
+_worker_allocator = None
+
+def _init_allocation_worker(allocator):
+    global _worker_allocator
+    _worker_allocator = allocator
+
+def _solve_allocation_component(allocator, voyages, start_date, end_date, hinted_pairs=None):
+    allocator = allocator or _worker_allocator
+    result = allocator._solve_voyages(voyages, start_date, end_date, hinted_pairs)
+    return result, allocator.pruning_stats
+
+class AllocationResultCache:
+    def __init__(self, storage, max_entries=256, max_bytes=50 * 1024 * 1024):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        storage.connection().executescript('''
+            CREATE TABLE IF NOT EXISTS allocation_cache
+                (cache_key TEXT PRIMARY KEY,
+                 result TEXT,
+                 size INTEGER,
+                 last_used REAL);
+            CREATE INDEX IF NOT EXISTS idx_allocation_cache_last_used ON allocation_cache (last_used);
+        ''')
+    
+    def get(self, key):
+        with self.storage.transaction() as conn:
+            row = conn.execute("SELECT result FROM allocation_cache WHERE cache_key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE allocation_cache SET last_used = ? WHERE cache_key = ?", (time.time(), key))
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        result = json.loads(row[0])
+        result['allocations'] = {v_id: e_ids for v_id, e_ids in result['allocations']}
+        return result
+    
+    def put(self, key, result):
+        stored = {**result, 'allocations': [[v_id, e_ids] for v_id, e_ids in result.get('allocations', {}).items()]}
+        payload = json.dumps(stored, default=lambda o: o.item() if isinstance(o, np.generic) else str(o))
+        with self.storage.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO allocation_cache (cache_key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                         (key, payload, len(payload), time.time()))
+            self._evict(conn)
+    
+    def _evict(self, conn):
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM allocation_cache").fetchone()
+        rows = conn.execute("SELECT cache_key, size FROM allocation_cache ORDER BY last_used").fetchall()
+        stale = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        if stale:
+            conn.executemany("DELETE FROM allocation_cache WHERE cache_key = ?", stale)
+    
+    def stats(self):
+        entries, size = self.storage.connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM allocation_cache").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+@st.cache_resource
+def get_allocation_cache():
+    return AllocationResultCache(get_storage())
+
+def generate_random_data(num_employees=10, num_vessels=3, num_voyages=3, seed=None):
+    skill_pool = {
+        'navigation': [1, 2, 3, 4, 5],
+        'cargo_handling': [1, 2, 3, 4],
+        'safety_training': [2, 3, 4, 5],
+        'engine_maintenance': [1, 2, 3, 4, 5],
+        'hazardous_materials': [1, 2, 3, 4, 5],
+        'medical_training': [1, 2, 3],
+        'communication': [2, 3, 4, 5]
+    }
+    positions = ['Captain', 'First Mate', 'Chief Engineer', 'Deck Officer', 
+                'Engineer', 'Deckhand', 'Cook', 'Medical Officer']
+    vessel_types = ['Container Ship', 'Tanker', 'Bulk Carrier', 'Ro-Ro']
+    routes = ['Shanghai to Los Angeles', 'Singapore to Rotterdam', 
+              'Houston to Hamburg', 'Dubai to Mumbai', 'Sydney to Auckland']
+    rng = np.random.default_rng(seed)
+    skill_names = list(skill_pool)
+    # Ranking a row of uniform draws gives a random ordering of the skills; each employee keeps its first 2-5
+    skill_order = rng.random((num_employees, len(skill_names))).argsort(axis=1)
+    num_skills = rng.integers(2, 6, num_employees)
+    level_draws = rng.random((num_employees, len(skill_names)))
+    employees = pd.DataFrame({
+        'employee_id': np.arange(101, 101 + num_employees),
+        'name': [f"Employee {i}" for i in range(1, num_employees + 1)],
+        'position': np.array(positions)[rng.integers(0, len(positions), num_employees)],
+        'skills': [{skill_names[j]: skill_pool[skill_names[j]][int(level_draws[i, j] * len(skill_pool[skill_names[j]]))]
+                    for j in skill_order[i, :num_skills[i]]} for i in range(num_employees)],
+        'daily_cost': rng.integers(200, 401, num_employees)
+    })
+    vessels = pd.DataFrame({
+        'vessel_id': np.arange(201, 201 + num_vessels),
+        'name': [f"Vessel {i}" for i in range(1, num_vessels + 1)],
+        'type': np.array(vessel_types)[rng.integers(0, len(vessel_types), num_vessels)],
+        'capacity': rng.integers(5000, 50001, num_vessels)
+    })
+    start_date = pd.Timestamp(2025, 3, 26) + pd.to_timedelta(rng.integers(0, 8, num_voyages), unit='D')
+    end_date = start_date + pd.to_timedelta(rng.integers(7, 22, num_voyages), unit='D')
+    voyages = pd.DataFrame({
+        'voyage_id': np.arange(301, 301 + num_voyages),
+        'vessel_id': rng.choice(vessels['vessel_id'].to_numpy(), num_voyages),
+        'route': np.array(routes)[rng.integers(0, len(routes), num_voyages)],
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d')
+    })
+    return employees, vessels, voyages
+
 # Third Application Setup (Ship Maintenance System)
-def generate_random_maintenance_data(num_records=100):
+def generate_random_maintenance_data(num_records=100, seed=None):
     ships = ['Titanic', 'Queen Mary', 'Black Pearl', 'Flying Dutchman', 'SS Minnow']
     components = ['Engine', 'Propeller', 'Navigation System', 'Hull', 'Electrical System', 
                   'Fuel System', 'Cooling System', 'Deck Equipment', 'Safety Equipment']
     maintenance_types = ['Preventive', 'Corrective', 'Predictive', 'Condition-based']
     statuses = ['Completed', 'Pending', 'Overdue', 'Cancelled']
-    data = []
-    for _ in range(num_records):
-        ship = random.choice(ships)
-        component = random.choice(components)
-        maintenance_type = random.choice(maintenance_types)
-        status = random.choice(statuses)
-        last_date = datetime.now() - timedelta(days=random.randint(1, 365))
-        next_date = last_date + timedelta(days=random.randint(30, 365))
-        cost = round(random.uniform(100, 10000), 2)
-        data.append({
-            'Ship': ship,
-            'Component': component,
-            'Maintenance Type': maintenance_type,
-            'Last Maintenance Date': last_date,
-            'Next Maintenance Date': next_date,
-            'Status': status,
-            'Cost ($)': cost,
-            'Hours Spent': random.randint(1, 48)
-        })
-    return pd.DataFrame(data)
-
-def generate_sensor_data(num_records=500):
-    components = ['Engine', 'Propeller', 'Cooling System', 'Electrical System']
-    parameters = {
-        'Engine': ['Temperature', 'Pressure', 'Vibration', 'Oil Level'],
-        'Propeller': ['RPM', 'Vibration', 'Lubrication', 'Wear'],
-        'Cooling System': ['Temperature', 'Flow Rate', 'Pressure', 'Coolant Level'],
-        'Electrical System': ['Voltage', 'Current', 'Resistance', 'Temperature']
-    }
-    data = []
-    for _ in range(num_records):
-        component = random.choice(components)
-        parameter = random.choice(parameters[component])
-        if parameter == 'Temperature':
-            value = round(random.uniform(50, 120), 2)
-            threshold = 100
-        elif parameter == 'Pressure':
-            value = round(random.uniform(1, 10), 2)
-            threshold = 8
-        elif parameter == 'Vibration':
-            value = round(random.uniform(0.1, 5), 2)
-            threshold = 3.5
-        elif parameter == 'Oil Level':
-            value = round(random.uniform(1, 10), 2)
-            threshold = 2
-        elif parameter == 'RPM':
-            value = random.randint(100, 1000)
-            threshold = 900
-        elif parameter == 'Lubrication':
-            value = round(random.uniform(0, 100), 2)
-            threshold = 30
-        elif parameter == 'Wear':
-            value = round(random.uniform(0, 100), 2)
-            threshold = 80
-        elif parameter == 'Flow Rate':
-            value = round(random.uniform(1, 20), 2)
-            threshold = 15
-        elif parameter == 'Coolant Level':
-            value = round(random.uniform(1, 10), 2)
-            threshold = 2
-        elif parameter == 'Voltage':
-            value = round(random.uniform(200, 500), 2)
-            threshold = 480
-        elif parameter == 'Current':
-            value = round(random.uniform(1, 50), 2)
-            threshold = 45
-        elif parameter == 'Resistance':
-            value = round(random.uniform(0.1, 100), 2)
-            threshold = 90
-        timestamp = datetime.now() - timedelta(minutes=random.randint(1, 10080))
-        alert = value > threshold
-        data.append({
-            'Timestamp': timestamp,
-            'Component': component,
-            'Parameter': parameter,
-            'Value': value,
-            'Threshold': threshold,
-            'Alert': alert
-        })
-    return pd.DataFrame(data)
+    rng = np.random.default_rng(seed)
+    last_date = pd.Timestamp(datetime.now()) - pd.to_timedelta(rng.integers(1, 366, num_records), unit='D')
+    return pd.DataFrame({
+        'Ship': pd.Categorical.from_codes(rng.integers(0, len(ships), num_records), ships),
+        'Component': pd.Categorical.from_codes(rng.integers(0, len(components), num_records), components),
+        'Maintenance Type': pd.Categorical.from_codes(rng.integers(0, len(maintenance_types), num_records), maintenance_types),
+        'Last Maintenance Date': last_date,
+        'Next Maintenance Date': last_date + pd.to_timedelta(rng.integers(30, 366, num_records), unit='D'),
+        'Status': pd.Categorical.from_codes(rng.integers(0, len(statuses), num_records), statuses),
+        'Cost ($)': rng.uniform(100, 10000, num_records).round(2),
+        'Hours Spent': rng.integers(1, 49, num_records)
+    })
+
+def iter_generated_chunks(generator, num_records, chunk_size=1000000, seed=None, **kwargs):
+    # One Generator threads through every chunk, so a seed reproduces the whole stream
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_records, chunk_size):
+        yield generator(min(chunk_size, num_records - start), seed=rng, **kwargs)
+
+def write_parquet_chunks(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+class MaintenanceStore:
+    # Display column -> SQL column; dates are stored as sortable ISO strings
+    COLUMNS = {'Ship': 'ship', 'Component': 'component', 'Maintenance Type': 'maintenance_type',
+               'Last Maintenance Date': 'last_date', 'Next Maintenance Date': 'next_date',
+               'Status': 'status', 'Cost ($)': 'cost', 'Hours Spent': 'hours_spent'}
+    CATEGORY_COLUMNS = ['Ship', 'Component', 'Maintenance Type', 'Status']
+    DATE_COLUMNS = ['Last Maintenance Date', 'Next Maintenance Date']
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, storage):
+        self.storage = storage
+        storage.connection().executescript('''
+            CREATE TABLE IF NOT EXISTS maintenance_records
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 ship TEXT,
+                 component TEXT,
+                 maintenance_type TEXT,
+                 last_date TEXT,
+                 next_date TEXT,
+                 status TEXT,
+                 cost REAL,
+                 hours_spent INTEGER);
+            CREATE INDEX IF NOT EXISTS idx_maintenance_ship ON maintenance_records (ship, next_date);
+            CREATE INDEX IF NOT EXISTS idx_maintenance_component ON maintenance_records (component, next_date);
+            CREATE INDEX IF NOT EXISTS idx_maintenance_type ON maintenance_records (maintenance_type, next_date);
+            CREATE INDEX IF NOT EXISTS idx_maintenance_next_date ON maintenance_records (next_date);
+            CREATE TABLE IF NOT EXISTS maintenance_summary
+                (ship TEXT,
+                 component TEXT,
+                 maintenance_type TEXT,
+                 status TEXT,
+                 count INTEGER,
+                 cost REAL,
+                 PRIMARY KEY (ship, component, maintenance_type, status));
+            CREATE TRIGGER IF NOT EXISTS maintenance_summary_insert AFTER INSERT ON maintenance_records BEGIN
+                INSERT INTO maintenance_summary (ship, component, maintenance_type, status, count, cost)
+                VALUES (new.ship, new.component, new.maintenance_type, new.status, 1, new.cost)
+                ON CONFLICT (ship, component, maintenance_type, status)
+                DO UPDATE SET count = count + 1, cost = cost + excluded.cost;
+            END;
+        ''')
+    
+    def __len__(self):
+        return self.storage.connection().execute("SELECT COALESCE(SUM(count), 0) FROM maintenance_summary").fetchone()[0]
+    
+    def _where(self, filters, next_between=None):
+        clauses = [f"{self.COLUMNS[column]} = ?" for column, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        if next_between is not None:
+            clauses.append("next_date >= ? AND next_date < ?")
+            params.extend(pd.Timestamp(value).strftime(self.DATE_FORMAT) for value in next_between)
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+    
+    def options(self, column):
+        sql_column = self.COLUMNS[column]
+        rows = self.storage.connection().execute(f"SELECT DISTINCT {sql_column} FROM maintenance_summary ORDER BY {sql_column}")
+        return [row[0] for row in rows]
+    
+    def rows(self, filters, next_between=None):
+        where, params = self._where(filters, next_between)
+        selected = ", ".join(f'{sql_column} AS "{column}"' for column, sql_column in self.COLUMNS.items())
+        data = pd.read_sql_query(f"SELECT {selected} FROM maintenance_records {where} ORDER BY next_date DESC, id",
+                                 self.storage.connection(), params=params)
+        for column in self.DATE_COLUMNS:
+            data[column] = pd.to_datetime(data[column], format=self.DATE_FORMAT)
+        return data
+    
+    def summary(self, filters):
+        # KPIs and charts read the trigger-maintained totals, never the records themselves
+        where, params = self._where(filters)
+        cells = pd.read_sql_query(f"SELECT component AS Component, maintenance_type AS \"Maintenance Type\", "
+                                  f"status AS Status, count, cost FROM maintenance_summary {where}",
+                                  self.storage.connection(), params=params)
+        type_counts = cells.groupby('Maintenance Type')['count'].sum()
+        cost_by_component = cells.groupby('Component')['cost'].sum()
+        return {
+            'total': int(cells['count'].sum()),
+            'preventive': int(cells.loc[cells['Maintenance Type'] == 'Preventive', 'count'].sum()),
+            'overdue': int(cells.loc[cells['Status'] == 'Overdue', 'count'].sum()),
+            'cost': float(cells['cost'].sum()),
+            'type_counts': type_counts[type_counts > 0].sort_values(ascending=False),
+            'cost_by_component': cost_by_component.rename('Cost ($)').reset_index()
+        }
+    
+    def version(self):
+        # Rows are append-only, so the newest id changes whenever any session adds a record
+        return self.storage.connection().execute("SELECT COALESCE(MAX(id), 0) FROM maintenance_records").fetchone()[0]
+    
+    def add(self, record):
+        self.extend([record])
+    
+    def extend(self, records):
+        records = pd.DataFrame(records, columns=list(self.COLUMNS))
+        for column in self.DATE_COLUMNS:
+            records[column] = pd.to_datetime(records[column]).dt.strftime(self.DATE_FORMAT)
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        with self.storage.transaction() as conn:
+            conn.executemany(f"INSERT INTO maintenance_records ({', '.join(self.COLUMNS.values())}) VALUES ({placeholders})",
+                             records.astype(object).itertuples(index=False, name=None))
+
+@st.cache_resource
+def get_maintenance_store():
+    store = MaintenanceStore(get_storage())
+    if len(store) == 0:
+        store.extend(generate_random_maintenance_data(200))
+    return store
+
+class MaintenanceViewCache:
+    # Aggregates, record views and figures keyed by (view, filters, data version), evicted least recently used
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def _sizeof(cls, value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return int(np.sum(value.memory_usage(deep=True)))
+        if isinstance(value, (tuple, list)):
+            return sum(cls._sizeof(item) for item in value)
+        if isinstance(value, dict):
+            return sum(cls._sizeof(item) for item in value.values())
+        if hasattr(value, 'data') and hasattr(value, 'layout'):
+            # Plotly figures hold their points as per-trace arrays
+            return sum(np.asarray(column).nbytes for trace in value.data
+                       for column in trace.to_plotly_json().values() if isinstance(column, (np.ndarray, list, tuple)))
+        return 0
+    
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+        value = compute()
+        size = self._sizeof(value)
+        # A view larger than the whole budget would only flush everything else, so it is recomputed instead
+        if size > self.max_bytes:
+            return value
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries[key][1]
+            self.entries[key] = (value, size)
+            self.entries.move_to_end(key)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+        return value
+    
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+@st.cache_resource
+def get_maintenance_view_cache():
+    return MaintenanceViewCache()
+
+def build_maintenance_charts(summary):
+    import plotly.express as px
+    type_counts = summary['type_counts']
+    type_fig = px.pie(type_counts, values=type_counts.values, names=type_counts.index)
+    cost_by_component = summary['cost_by_component']
+    cost_fig = px.bar(cost_by_component, x='Component', y='Cost ($)', color='Component')
+    return type_fig, cost_fig
+
+def build_preventive_schedule(store, filters, year, month):
+    import plotly.express as px
+    if filters['Maintenance Type'] not in (None, 'Preventive'):
+        return None, None
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + month // 12, month % 12 + 1, 1)
+    monthly_schedule = store.rows({**filters, 'Maintenance Type': 'Preventive'}, next_between=(month_start, month_end))
+    if monthly_schedule.empty:
+        return None, None
+    fig = px.timeline(
+        monthly_schedule, 
+        x_start="Last Maintenance Date", 
+        x_end="Next Maintenance Date", 
+        y="Component",
+        color="Ship",
+        title="Maintenance Schedule Timeline"
+    )
+    return monthly_schedule.iloc[::-1], fig
+
+SENSOR_COMPONENTS = {
+    'Engine': ['Temperature', 'Pressure', 'Vibration', 'Oil Level'],
+    'Propeller': ['RPM', 'Vibration', 'Lubrication', 'Wear'],
+    'Cooling System': ['Temperature', 'Flow Rate', 'Pressure', 'Coolant Level'],
+    'Electrical System': ['Voltage', 'Current', 'Resistance', 'Temperature']
+}
+# (low, high, alert threshold); RPM is drawn as a whole number
+SENSOR_PARAMETERS = {
+    'Temperature': (50, 120, 100),
+    'Pressure': (1, 10, 8),
+    'Vibration': (0.1, 5, 3.5),
+    'Oil Level': (1, 10, 2),
+    'RPM': (100, 1000, 900),
+    'Lubrication': (0, 100, 30),
+    'Wear': (0, 100, 80),
+    'Flow Rate': (1, 20, 15),
+    'Coolant Level': (1, 10, 2),
+    'Voltage': (200, 500, 480),
+    'Current': (1, 50, 45),
+    'Resistance': (0.1, 100, 90)
+}
+
+def generate_sensor_data(num_records=500, seed=None):
+    rng = np.random.default_rng(seed)
+    components = list(SENSOR_COMPONENTS)
+    parameters = list(SENSOR_PARAMETERS)
+    low, high, threshold = (np.array(column, dtype=float) for column in zip(*SENSOR_PARAMETERS.values()))
+    # Every component has the same number of parameters, so one draw per row picks a parameter within it
+    component_parameters = np.array([[parameters.index(p) for p in SENSOR_COMPONENTS[c]] for c in components])
+    component = rng.integers(0, len(components), num_records)
+    parameter = component_parameters[component, rng.integers(0, component_parameters.shape[1], num_records)]
+    value = (low[parameter] + (high[parameter] - low[parameter]) * rng.random(num_records)).round(2)
+    is_rpm = parameter == parameters.index('RPM')
+    rpm_low, rpm_high, _ = SENSOR_PARAMETERS['RPM']
+    value[is_rpm] = rng.integers(rpm_low, rpm_high + 1, int(is_rpm.sum()))
+    return pd.DataFrame({
+        'Timestamp': pd.Timestamp(datetime.now()) - pd.to_timedelta(rng.integers(1, 10081, num_records), unit='min'),
+        'Component': pd.Categorical.from_codes(component, components),
+        'Parameter': pd.Categorical.from_codes(parameter, parameters),
+        'Value': value,
+        'Threshold': threshold[parameter],
+        'Alert': value > threshold[parameter]
+    })
+
+SENSOR_FEED_PATH = os.getenv("SENSOR_FEED_PATH")
+SENSOR_WINDOW = int(os.getenv("SENSOR_WINDOW", "500"))
+
+class SensorChannel:
+    # Fixed-size ring buffer for one (component, parameter) with running statistics, so each reading is O(1)
+    def __init__(self, threshold, window=SENSOR_WINDOW, alpha=0.1):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.values = np.zeros(window)
+        self.times = np.zeros(window, dtype='datetime64[us]')
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.ewma = None
+        self.rate = 0.0
+    
+    def add(self, timestamp, value):
+        window = len(self.values)
+        if self.count >= window:
+            self.total -= self.values[self.head]
+        self.values[self.head] = value
+        self.times[self.head] = np.datetime64(timestamp, 'us')
+        self.head = (self.head + 1) % window
+        self.count += 1
+        self.total += value
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+        # Change per minute across the window, from its oldest reading to this one
+        oldest = self.head if self.count >= window else 0
+        minutes = (self.times[self.head - 1] - self.times[oldest]) / np.timedelta64(1, 'm')
+        self.rate = (value - self.values[oldest]) / minutes if minutes > 0 else 0.0
+    
+    @property
+    def mean(self):
+        return self.total / min(self.count, len(self.values))
+    
+    @property
+    def last(self):
+        return self.values[self.head - 1]
+    
+    @property
+    def alerting(self):
+        # Alerts follow the smoothed level, so a single noisy reading over the threshold does not raise one
+        return self.ewma is not None and self.ewma > self.threshold
+    
+    def history(self):
+        if self.count < len(self.values):
+            return self.times[:self.count], self.values[:self.count]
+        return np.roll(self.times, -self.head), np.roll(self.values, -self.head)
+
+class SensorStream:
+    def __init__(self, window=SENSOR_WINDOW, alpha=0.1, max_alerts=1000):
+        self.window = window
+        self.alpha = alpha
+        self.channels = {}
+        self.alerts = deque(maxlen=max_alerts)
+        self.readings = 0
+        self.version = 0
+        self.snapshots = {}
+        self.lock = threading.Lock()
+    
+    def ingest(self, timestamp, component, parameter, value):
+        with self.lock:
+            channel = self.channels.get((component, parameter))
+            if channel is None:
+                channel = SensorChannel(SENSOR_PARAMETERS[parameter][2], self.window, self.alpha)
+                self.channels[(component, parameter)] = channel
+            channel.add(timestamp, value)
+            self.readings += 1
+            breach = value > channel.threshold
+            if breach or channel.alerting:
+                self.alerts.append({
+                    'Timestamp': pd.Timestamp(timestamp),
+                    'Component': component,
+                    'Parameter': parameter,
+                    'Value': value,
+                    'Threshold': channel.threshold,
+                    'Rolling Mean': round(channel.mean, 2),
+                    'EWMA': round(channel.ewma, 2),
+                    'Rate (/min)': round(channel.rate, 4),
+                    'Alert': channel.alerting,
+                    'Raw Breach': breach
+                })
+                self.version += 1
+    
+    def ingest_frame(self, data):
+        for reading in data.sort_values('Timestamp', kind='stable').itertuples(index=False):
+            self.ingest(reading.Timestamp, reading.Component, reading.Parameter, reading.Value)
+    
+    def start(self, source):
+        def consume():
+            for reading in source:
+                self.ingest(*reading)
+        thread = threading.Thread(target=consume, name="sensor-stream", daemon=True)
+        thread.start()
+        return thread
+    
+    def _snapshot(self, name, build):
+        # Dashboard reruns between alerts reuse the last frame instead of rebuilding it
+        with self.lock:
+            cached = self.snapshots.get(name)
+            if cached is None or cached[0] != self.version:
+                cached = (self.version, build())
+                self.snapshots[name] = cached
+            return cached[1]
+    
+    def alert_frame(self):
+        return self._snapshot('alerts', lambda: pd.DataFrame(
+            list(reversed(self.alerts)), columns=['Timestamp', 'Component', 'Parameter', 'Value', 'Threshold',
+                                            'Rolling Mean', 'EWMA', 'Rate (/min)', 'Alert', 'Raw Breach']))
+    
+    def stats_frame(self):
+        with self.lock:
+            return pd.DataFrame([{
+                'Component': component,
+                'Parameter': parameter,
+                'Last': channel.last,
+                'Rolling Mean': round(channel.mean, 2),
+                'EWMA': round(channel.ewma, 2),
+                'Rate (/min)': round(channel.rate, 4),
+                'Threshold': channel.threshold,
+                'Alert': channel.alerting,
+                'Raw Breach': channel.last > channel.threshold
+            } for (component, parameter), channel in sorted(self.channels.items())])
+    
+    def history(self, component):
+        frames = []
+        with self.lock:
+            for (channel_component, parameter), channel in self.channels.items():
+                if channel_component == component:
+                    times, values = channel.history()
+                    frames.append(pd.DataFrame({'Timestamp': times, 'Parameter': parameter, 'Value': values,
+                                                'Threshold': channel.threshold}))
+        if not frames:
+            return pd.DataFrame(columns=['Timestamp', 'Parameter', 'Value', 'Threshold'])
+        return pd.concat(frames, ignore_index=True).sort_values('Timestamp')
+
+def simulate_sensor_readings(interval=0.25, batch_size=64, seed=None):
+    rng = np.random.default_rng(seed)
+    while True:
+        batch = generate_sensor_data(batch_size, seed=rng)
+        for reading in batch.itertuples(index=False):
+            yield datetime.now(), reading.Component, reading.Parameter, reading.Value
+            time.sleep(interval)
+
+def tail_sensor_file(path, poll_interval=0.5):
+    # Follows a growing CSV of Timestamp,Component,Parameter,Value rows; a partial last line waits for its newline
+    with open(path, newline='') as f:
+        pending = ''
+        while True:
+            line = f.readline()
+            if not line:
+                time.sleep(poll_interval)
+                continue
+            pending += line
+            if not pending.endswith('\n'):
+                continue
+            row, pending = next(csv.reader([pending])), ''
+            if len(row) != 4 or row[2] not in SENSOR_PARAMETERS:
+                continue
+            try:
+                yield pd.Timestamp(row[0]), row[1], row[2], float(row[3])
+            except ValueError:
+                continue
+
+@st.cache_resource
+def get_sensor_stream():
+    stream = SensorStream()
+    stream.ingest_frame(generate_sensor_data(1000))
+    stream.start(tail_sensor_file(SENSOR_FEED_PATH) if SENSOR_FEED_PATH else simulate_sensor_readings())
+    return stream
 
 # Application Functions
 def app1():
-    def extract_text_from_file(file):
-        text = ""
-        if file.type == "application/pdf":
-            pdf_reader = PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        elif file.type == "text/plain":
-            text = file.getvalue().decode("utf-8")
-        elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            doc = Document(file)
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        elif file.type == "application/json":
-            json_data = json.load(file)
-            text = json.dumps(json_data, indent=4)
-        elif file.type == "text/markdown":
-            text = file.getvalue().decode("utf-8")
-        elif file.type in ["text/csv", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"]:
-            df = pd.read_csv(file) if file.type == "text/csv" else pd.read_excel(file)
-            text = df.to_string()
-        return text
-
-    def chunk_text(text, chunk_size=1000, overlap=200):
-        chunks = []
-        start = 0
-        text_length = len(text)
-        while start < text_length:
-            end = min(start + chunk_size, text_length)
-            if end < text_length and end - start == chunk_size:
-                last_period = max(text.rfind('.', start, end), text.rfind('\n', start, end))
-                if last_period > start + chunk_size // 2: 
-                    end = last_period + 1
-            chunks.append(text[start:end])
-            start = end - overlap if end < text_length else text_length
-        return chunks
-
-    def preprocess_text(text):
-        text = re.sub(r'[^\w\s]', '', text.lower())
-        return word_tokenize(text)
-
-    def store_file_in_db(filename, content):
-        c.execute("SELECT COUNT(*) FROM files WHERE filename = ?", (filename,))
-        if c.fetchone()[0] == 0:
-            c.execute("INSERT INTO files (filename, content) VALUES (?, ?)", (filename, content))
-            conn.commit()
-            chunks = chunk_text(content)
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{filename}_chunk_{i}"
-                embedding = embedding_model.encode(chunk).tolist()
-                collection.add(documents=[chunk], embeddings=[embedding], ids=[chunk_id], metadatas=[{"filename": filename, "chunk_index": i}])
-            st.success(f"'{filename}' uploaded successfully!")
+    def retrieve_relevant_context(query, top_k=10):
+        query_cache = get_query_cache()
+        ranked = query_cache.get_results(query, top_k)
+        if ranked is not None:
+            cached = get_collection().get(ids=[doc_id for doc_id, _ in ranked], include=["documents", "metadatas"])
+            documents = dict(zip(cached["ids"], zip(cached["documents"], cached["metadatas"])))
+            ranked_docs = [(documents[doc_id][0], doc_id, score, documents[doc_id][1] or {})
+                           for doc_id, score in ranked if doc_id in documents]
         else:
-            st.warning(f"'{filename}' is already uploaded.")
+            version = query_cache.version
+            ranked_docs = rank_documents(query, top_k)
+            query_cache.put_results(query, top_k, [(doc_id, score) for _, doc_id, score, _ in ranked_docs], version)
+        if not ranked_docs:
+            return "", {}
+        return assemble_context(ranked_docs)
 
-    def retrieve_relevant_context(query, top_k=10):
-        query_embedding = embedding_model.encode(query).tolist()
+    def rank_documents(query, top_k):
+        query_cache = get_query_cache()
+        query_embedding = query_cache.get_embedding(query)
+        if query_embedding is None:
+            query_embedding = get_embedding_model().encode(QueryCache.normalize(query)).tolist()
+            query_cache.put_embedding(query, query_embedding)
+        collection = get_collection()
         results = collection.query(query_embeddings=[query_embedding], n_results=top_k*2)
-        if not results["documents"][0]:
-            return ""
-        retrieved_docs = results["documents"][0]
-        doc_ids = results["ids"][0]
-        tokenized_query = preprocess_text(query)
-        tokenized_docs = [preprocess_text(doc) for doc in retrieved_docs]
-        bm25 = BM25Okapi(tokenized_docs)
-        bm25_scores = bm25.get_scores(tokenized_query)
-        vector_scores = [1.0 - results["distances"][0][i] for i in range(len(retrieved_docs))]
-        max_bm25 = max(bm25_scores) if len(bm25_scores) > 0 else 1.0
-        max_vector = max(vector_scores) if vector_scores else 1.0
-        normalized_bm25 = [score/max_bm25 for score in bm25_scores]
+        candidates = {}
+        for doc_id, doc, distance, metadata in zip(results["ids"][0], results["documents"][0], results["distances"][0],
+                                                   results["metadatas"][0]):
+            candidates[doc_id] = (doc, 1.0 - distance, metadata or {})
+        bm25_scores = get_bm25_index().scores(preprocess_text(query))
+        bm25_top = sorted(bm25_scores, key=bm25_scores.get, reverse=True)[:top_k*2]
+        missing = [doc_id for doc_id in bm25_top if doc_id not in candidates]
+        if missing:
+            extra = collection.get(ids=missing, include=["documents", "embeddings", "metadatas"])
+            query_vector = np.array(query_embedding)
+            for doc_id, doc, embedding, metadata in zip(extra["ids"], extra["documents"], extra["embeddings"],
+                                                        extra["metadatas"]):
+                # Chroma's default l2 space reports squared euclidean distance
+                candidates[doc_id] = (doc, 1.0 - float(np.sum((query_vector - np.array(embedding)) ** 2)),
+                                      metadata or {})
+        if not candidates:
+            return []
+        doc_ids = list(candidates)
+        retrieved_docs = [candidates[doc_id][0] for doc_id in doc_ids]
+        vector_scores = [candidates[doc_id][1] for doc_id in doc_ids]
+        bm25_candidate_scores = [bm25_scores.get(doc_id, 0.0) for doc_id in doc_ids]
+        max_bm25 = max(bm25_candidate_scores) or 1.0
+        max_vector = max(vector_scores) or 1.0
+        normalized_bm25 = [score/max_bm25 for score in bm25_candidate_scores]
         normalized_vector = [score/max_vector for score in vector_scores]
         alpha = 0.5
         combined_scores = [(alpha * v_score + (1-alpha) * bm_score)
                           for v_score, bm_score in zip(normalized_vector, normalized_bm25)]
-        doc_score_pairs = list(zip(retrieved_docs, doc_ids, combined_scores))
-        ranked_docs = sorted(doc_score_pairs, key=lambda x: x[2], reverse=True)[:top_k]
-        context_chunks = []
-        for doc, doc_id, score in ranked_docs:
-            metadata = f"Source: {doc_id.split('_chunk_')[0]} (Score: {score:.3f})"
-            context_chunks.append(f"{metadata}\n{doc}")
-        return "\n\n" + "-"*50 + "\n\n".join(context_chunks)
-
-    def azure_openai_query(question, context, api_key, endpoint):
-        client = AzureOpenAI(
-            api_key=api_key,
-            api_version="2023-05-15",
-            azure_endpoint=endpoint
-        )
-        system_prompt = """
-            You are an AI assistant tasked with performing comprehensive extraction of information from ALL provided context chunks.
-            When responding to a user's question, adhere strictly to the following guidelines:
-            - Review EVERY context chunk provided thoroughly, ensuring you cover ALL occurrences of relevant information.
-            - Extract and list EVERY relevant piece of information explicitly and separately, even if the same or similar information appears multiple times or across different chunks.
-            - Do NOT stop after partial matches or the initial findings; CONTINUE reviewing ALL chunks until no additional relevant information remains.
-            - Clearly format your responses in a structured manner (e.g., bullet points or numbered lists) for readability.
-            Provide explicit source citations indicating:
-            - The exact document filename.
-            - The specific chunk or page number from which each piece of information was extracted.
-            Your goal is complete accuracy and exhaustive retrieval—no relevant data should be omitted.
-        """
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}\nAnswer:"}
-        ]
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000,
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0
-        )
-        return response.choices[0].message.content.strip()
+        metadatas = [candidates[doc_id][2] for doc_id in doc_ids]
+        doc_score_pairs = list(zip(retrieved_docs, doc_ids, combined_scores, metadatas))
+        return sorted(doc_score_pairs, key=lambda x: x[2], reverse=True)[:top_k]
 
     st.title("Contextual RAG Q&A Web Application")
     tab1, tab2, tab3 = st.tabs(["Admin", "Credentials", "Chat"])
@@ -486,31 +2075,49 @@ def app1():
                 else:
                     st.error("Invalid credentials")
         if st.session_state.admin_logged_in:
+            ingestion_queue = get_ingestion_queue()
             uploaded_files = st.file_uploader("Upload files", accept_multiple_files=True, type=["pdf", "txt", "docx", "json", "md", "csv", "xlsx"])
             if uploaded_files:
-                for file in uploaded_files:
-                    text = extract_text_from_file(file)
-                    store_file_in_db(file.name, text)
+                if 'submitted_uploads' not in st.session_state:
+                    st.session_state.submitted_uploads = set()
+                new_files = [file for file in uploaded_files if file.file_id not in st.session_state.submitted_uploads]
+                if new_files:
+                    ingestion_queue.submit([(file.name, file.type, file.getvalue()) for file in new_files])
+                    st.session_state.submitted_uploads.update(file.file_id for file in new_files)
+
+            @st.fragment(run_every=2)
+            def show_ingestion_progress():
+                jobs = ingestion_queue.jobs()
+                active = jobs[jobs['status'].isin(IngestionQueue.ACTIVE_STATUSES)]
+                for job in active.itertuples():
+                    done = job.embedded_chunks / job.total_chunks if job.total_chunks else 0.0
+                    st.progress(done, text=f"{job.filename}: {job.status} ({job.embedded_chunks}/{job.total_chunks} chunks, "
+                                           f"{job.reused_chunks} reused)")
+                if not jobs.empty:
+                    with st.expander(f"Ingestion jobs ({len(active)} active)"):
+                        st.dataframe(jobs, use_container_width=True, hide_index=True)
+            show_ingestion_progress()
             st.subheader("Uploaded Files")
-            c.execute("SELECT filename FROM files")
-            files = c.fetchall()
-            if files:
-                df = pd.DataFrame(files, columns=["Filename"])
-                for filename in df["Filename"]:
-                    col1, col2 = st.columns([4, 1])
-                    col1.text(filename)
-                    if col2.button("Delete", key=filename):
-                        c.execute("DELETE FROM files WHERE filename = ?", (filename,))
-                        conn.commit()
-                        try:
-                            file_chunks = collection.get(where={"filename": filename})
-                            if file_chunks and "ids" in file_chunks and file_chunks["ids"]:
-                                collection.delete(ids=file_chunks["ids"])
-                        except Exception as e:
-                            st.error(f"Error deleting from ChromaDB: {e}")
-                        st.rerun()
+            storage = get_storage()
+            search = st.text_input("Search filenames").strip()
+            page_size = 50
+            total = storage.count_files(search)
+            if total:
+                pages = (total + page_size - 1) // page_size
+                page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+                files = storage.list_files(search, limit=page_size, offset=(page - 1) * page_size)
+                selection = st.dataframe(files, use_container_width=True, hide_index=True, on_select="rerun",
+                                         selection_mode="multi-row", key=f"uploaded_files_{search}_{page}")
+                selected = files["Filename"].iloc[selection.selection.rows].tolist()
+                st.caption(f"{total} files, showing {len(files)}")
+                if st.button(f"Delete selected ({len(selected)})", disabled=not selected):
+                    try:
+                        ingestion_queue.remove_files(selected)
+                    except Exception as e:
+                        st.error(f"Error deleting from ChromaDB: {e}")
+                    st.rerun()
             else:
-                st.info("No files uploaded yet.")
+                st.info("No files match the search." if search else "No files uploaded yet.")
             if st.button("Logout"):
                 st.session_state.admin_logged_in = False
                 st.rerun()
@@ -529,92 +2136,62 @@ def app1():
             st.session_state.show_context = False
         show_context = st.sidebar.checkbox("Show retrieved context", value=st.session_state.show_context)
         st.session_state.show_context = show_context
+        stream_answers = st.sidebar.checkbox("Stream answers", value=True)
+        for name, entry in get_latency_stats().summary().items():
+            st.sidebar.caption(f"Azure {name}: {entry['count']} calls, mean {entry['mean'] * 1000:.0f} ms, "
+                               f"p95 {entry['p95'] * 1000:.0f} ms, last {entry['last'] * 1000:.0f} ms")
         question = st.chat_input("Ask me anything...")
         if question:
             st.chat_message("user").markdown(question)
+            answer = None
             with st.status("Searching documents...", expanded=True) as status:
-                context = retrieve_relevant_context(question)
+                context, context_stats = retrieve_relevant_context(question)
                 if not context:
                     status.update(label="No relevant documents found", state="error")
                     answer = "I couldn't find any relevant information in the knowledge base. Please try a different question or upload more documents."
                 else:
+                    st.caption(f"Context: {context_stats['tokens']} of {CONTEXT_TOKEN_BUDGET} tokens, "
+                               f"{context_stats['passages']} passages from {context_stats['selected']} of "
+                               f"{context_stats['chunks']} chunks ({context_stats['duplicates']} near-duplicates dropped)")
                     if st.session_state.show_context:
                         st.sidebar.markdown("### Retrieved Context")
                         st.sidebar.markdown(context)
-                    status.update(label="Generating answer...", state="running")
-                    answer = azure_openai_query(question, context, st.session_state.api_key, st.session_state.endpoint)
-                    status.update(label="Answer generated!", state="complete")
-            st.chat_message("assistant").markdown(answer)
+                    if stream_answers:
+                        status.update(label="Context retrieved, streaming answer...", state="complete")
+                    else:
+                        status.update(label="Generating answer...", state="running")
+                        answer = azure_openai_query(question, context, st.session_state.api_key, st.session_state.endpoint)
+                        status.update(label="Answer generated!", state="complete")
+            if answer is None:
+                stream_stats = {}
+                with st.chat_message("assistant"):
+                    answer = st.write_stream(azure_openai_stream(question, context, st.session_state.api_key,
+                                                                 st.session_state.endpoint, stream_stats))
+                    answer = answer.strip() if isinstance(answer, str) else ""
+                    if 'ttft' in stream_stats:
+                        st.caption(f"Time to first token: {stream_stats['ttft']:.2f}s, "
+                                   f"total: {stream_stats['total']:.2f}s")
+            else:
+                st.chat_message("assistant").markdown(answer)
             st.session_state.messages.append({"role": "user", "content": question})
             st.session_state.messages.append({"role": "assistant", "content": answer})
 
 def app2():
-    def generate_random_data(num_employees=10, num_vessels=3, num_voyages=3):
-        skill_pool = {
-            'navigation': [1, 2, 3, 4, 5],
-            'cargo_handling': [1, 2, 3, 4],
-            'safety_training': [2, 3, 4, 5],
-            'engine_maintenance': [1, 2, 3, 4, 5],
-            'hazardous_materials': [1, 2, 3, 4, 5],
-            'medical_training': [1, 2, 3],
-            'communication': [2, 3, 4, 5]
-        }
-        positions = ['Captain', 'First Mate', 'Chief Engineer', 'Deck Officer', 
-                    'Engineer', 'Deckhand', 'Cook', 'Medical Officer']
-        employees = []
-        for i in range(1, num_employees + 1):
-            num_skills = random.randint(2, 5)
-            skills = {}
-            for skill in random.sample(list(skill_pool.keys()), num_skills):
-                skills[skill] = random.choice(skill_pool[skill])
-            employees.append({
-                'employee_id': 100 + i,
-                'name': f"Employee {i}",
-                'position': random.choice(positions),
-                'skills': skills,
-                'daily_cost': random.randint(200, 400)
-            })
-        vessel_types = ['Container Ship', 'Tanker', 'Bulk Carrier', 'Ro-Ro']
-        vessels = []
-        for i in range(1, num_vessels + 1):
-            vessels.append({
-                'vessel_id': 200 + i,
-                'name': f"Vessel {i}",
-                'type': random.choice(vessel_types),
-                'capacity': random.randint(5000, 50000)
-            })
-        routes = ['Shanghai to Los Angeles', 'Singapore to Rotterdam', 
-                  'Houston to Hamburg', 'Dubai to Mumbai', 'Sydney to Auckland']
-        voyages = []
-        base_date = datetime(2025, 3, 26)
-        for i in range(1, num_voyages + 1):
-            start_date = base_date + timedelta(days=random.randint(0, 7))
-            duration = random.randint(7, 21)
-            end_date = start_date + timedelta(days=duration)
-            voyages.append({
-                'voyage_id': 300 + i,
-                'vessel_id': random.choice([v['vessel_id'] for v in vessels]),
-                'route': random.choice(routes),
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d')
-            })
-        return (
-            pd.DataFrame(employees),
-            pd.DataFrame(vessels),
-            pd.DataFrame(voyages)
-        )
-
-    allocator = ShippingResourceAllocator()
     st.title("Shipping Resource Allocation System")
     st.sidebar.header("Configuration")
+    require_skill = st.sidebar.checkbox("Skip crew without required skills", value=False)
+    backend = st.sidebar.selectbox("Solver Backend", list(ShippingResourceAllocator.SOLVER_BACKENDS))
+    time_limit = st.sidebar.number_input("Solver Time Limit (s, 0 = none)", min_value=0, value=60)
+    allocator = ShippingResourceAllocator(eligibility_rules={'require_skill': require_skill}, backend=backend,
+                                          time_limit=time_limit or None)
     use_random_data = st.sidebar.checkbox("Use Random Data", value=True)
-    random.seed(st.sidebar.number_input("Random Seed", value=42))
+    seed = int(st.sidebar.number_input("Random Seed", value=42))
     if use_random_data:
         num_employees = st.sidebar.slider("Number of Employees", 5, 50, 15)
         num_vessels = st.sidebar.slider("Number of Vessels", 1, 10, 3)
         num_voyages = st.sidebar.slider("Number of Voyages", 1, 10, 3)
         employees_df, vessels_df, voyages_df = generate_random_data(
-            num_employees, num_vessels, num_voyages)
+            num_employees, num_vessels, num_voyages, seed=seed)
     else:
         employees_file = st.sidebar.file_uploader("Upload Employees CSV", type="csv")
         vessels_file = st.sidebar.file_uploader("Upload Vessels CSV", type="csv")
@@ -625,6 +2202,10 @@ def app2():
         employees_df = pd.read_csv(employees_file)
         vessels_df = pd.read_csv(vessels_file)
         voyages_df = pd.read_csv(voyages_file)
+    allocation_cache = get_allocation_cache()
+    cache_stats = allocation_cache.stats()
+    st.sidebar.caption(f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+                       f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024:.0f} KB)")
     col1, col2 = st.columns(2)
     with col1:
         start_date = st.date_input("Start Date", date(2025, 3, 26))
@@ -638,6 +2219,41 @@ def app2():
         st.dataframe(vessels_df)
     with tab3:
         st.dataframe(voyages_df)
+    def show_results(allocator, result):
+        st.subheader("Optimization Results")
+        st.write(f"Status: {result.get('status')}")
+        if result.get('components'):
+            st.write(f"Independent subproblems solved: {result['components']}")
+        if 'reoptimized_voyages' in result:
+            st.write(f"Voyages re-optimized: {result['reoptimized_voyages']}")
+        if allocator.pruning_stats:
+            st.write(f"Assignment variables pruned: {allocator.pruning_stats['pruned_variables']} "
+                     f"of {allocator.pruning_stats['candidate_variables']}")
+        report = allocator.generate_report(result)
+        if isinstance(report, list):
+            st.success(f"Found {len(report)} voyage allocations:")
+            for voyage in report:
+                with st.expander(f"Voyage {voyage['voyage_id']}: {voyage['vessel']} ({voyage['type']})"):
+                    st.write(f"**Route:** {voyage['route']}")
+                    st.write(f"**Dates:** {voyage['dates']}")
+                    st.write(f"**Crew Members ({voyage['crew_count']}):**")
+                    crew_df = pd.DataFrame(voyage['crew'])
+                    st.dataframe(crew_df)
+                    skills_data = []
+                    for crew in voyage['crew']:
+                        for skill, level in crew['skills'].items():
+                            skills_data.append({
+                                'Name': crew['name'],
+                                'Skill': skill,
+                                'Level': level
+                            })
+                    if skills_data:
+                        skills_df = pd.DataFrame(skills_data)
+                        st.subheader("Crew Skills")
+                        st.bar_chart(skills_df.pivot(index='Name', columns='Skill', values='Level'))
+        else:
+            st.warning(f"Report: {report.get('status')}")
+
     if st.button("Run Optimization"):
         with st.spinner("Loading data and optimizing..."):
             if not allocator.load_data(employees_df, vessels_df, voyages_df):
@@ -647,151 +2263,142 @@ def app2():
             st.write(f"- Employees: {len(allocator.employees)}")
             st.write(f"- Vessels: {len(allocator.vessels)}")
             st.write(f"- Voyages: {len(allocator.voyages)}")
-            result = allocator.optimize_allocation(start_date, end_date)
-            st.subheader("Optimization Results")
-            st.write(f"Status: {result.get('status')}")
-            report = allocator.generate_report(result)
-            if isinstance(report, list):
-                st.success(f"Found {len(report)} voyage allocations:")
-                for voyage in report:
-                    with st.expander(f"Voyage {voyage['voyage_id']}: {voyage['vessel']} ({voyage['type']})"):
-                        st.write(f"**Route:** {voyage['route']}")
-                        st.write(f"**Dates:** {voyage['dates']}")
-                        st.write(f"**Crew Members ({voyage['crew_count']}):**")
-                        crew_df = pd.DataFrame(voyage['crew'])
-                        st.dataframe(crew_df)
-                        skills_data = []
-                        for crew in voyage['crew']:
-                            for skill, level in crew['skills'].items():
-                                skills_data.append({
-                                    'Name': crew['name'],
-                                    'Skill': skill,
-                                    'Level': level
-                                })
-                        if skills_data:
-                            skills_df = pd.DataFrame(skills_data)
-                            st.subheader("Crew Skills")
-                            st.bar_chart(skills_df.pivot(index='Name', columns='Skill', values='Level'))
+            cache_key = allocator.cache_key(employees_df, vessels_df, voyages_df, start_date, end_date)
+            result = allocation_cache.get(cache_key)
+            if result is not None and result.get('status') == 'OPTIMAL':
+                st.info("Loaded allocation from result cache")
             else:
-                st.warning(f"Report: {report.get('status')}")
+                # A cached FEASIBLE result (time limit reached) only seeds a fresh solve
+                hint = result if result is not None else st.session_state.get('last_allocation')
+                result = allocator.optimize_allocation(start_date, end_date, hint=hint)
+                # Only proven optima are cached, so a time-limited solve is retried next time
+                if result.get('status') == 'OPTIMAL':
+                    allocation_cache.put(cache_key, result)
+            if result.get('status') in ('OPTIMAL', 'FEASIBLE'):
+                st.session_state.last_allocation = result
+                st.session_state.allocator = allocator
+            show_results(allocator, result)
+    if st.session_state.get('allocator') and st.session_state.get('last_allocation'):
+        live_allocator = st.session_state.allocator
+        delta = None
+        with st.expander("Incremental Update"):
+            remove_ids = st.multiselect("Crew unavailable", [e['employee_id'] for e in live_allocator.employees])
+            shifted_voyage = st.selectbox("Voyage to reschedule", ['None'] + list(live_allocator.voyage_index))
+            shift_days = st.number_input("Shift voyage by days", value=0, step=1)
+            if st.button("Re-optimize"):
+                delta = {'remove_employees': remove_ids}
+                if shifted_voyage != 'None' and shift_days:
+                    voyage = live_allocator.voyage_index[shifted_voyage]
+                    shift = pd.Timedelta(days=shift_days)
+                    delta['voyage_dates'] = {shifted_voyage: (voyage['start_date'] + shift, voyage['end_date'] + shift)}
+        if delta is not None:
+            with st.spinner("Re-optimizing affected voyages..."):
+                result = live_allocator.reoptimize(st.session_state.last_allocation, start_date, end_date, **delta)
+            if result.get('status') in ('OPTIMAL', 'FEASIBLE'):
+                st.session_state.last_allocation = result
+            show_results(live_allocator, result)
 
 def app3():
-    if 'maintenance_data' not in st.session_state:
-        st.session_state.maintenance_data = generate_random_maintenance_data(200)
-    if 'sensor_data' not in st.session_state:
-        st.session_state.sensor_data = generate_sensor_data(1000)
+    import plotly.express as px
+    store = get_maintenance_store()
+    view_cache = get_maintenance_view_cache()
+    sensor_stream = get_sensor_stream()
     st.sidebar.header("Filters")
-    selected_ship = st.sidebar.selectbox("Select Ship", ['All'] + list(st.session_state.maintenance_data['Ship'].unique()))
-    selected_component = st.sidebar.selectbox("Select Component", ['All'] + list(st.session_state.maintenance_data['Component'].unique()))
-    selected_status = st.sidebar.selectbox("Select Status", ['All'] + list(st.session_state.maintenance_data['Status'].unique()))
-    selected_type = st.sidebar.selectbox("Select Maintenance Type", ['All'] + list(st.session_state.maintenance_data['Maintenance Type'].unique()))
-    filtered_data = st.session_state.maintenance_data.copy()
-    if selected_ship != 'All':
-        filtered_data = filtered_data[filtered_data['Ship'] == selected_ship]
-    if selected_component != 'All':
-        filtered_data = filtered_data[filtered_data['Component'] == selected_component]
-    if selected_status != 'All':
-        filtered_data = filtered_data[filtered_data['Status'] == selected_status]
-    if selected_type != 'All':
-        filtered_data = filtered_data[filtered_data['Maintenance Type'] == selected_type]
+    selected_ship = st.sidebar.selectbox("Select Ship", ['All'] + store.options('Ship'))
+    selected_component = st.sidebar.selectbox("Select Component", ['All'] + store.options('Component'))
+    selected_status = st.sidebar.selectbox("Select Status", ['All'] + store.options('Status'))
+    selected_type = st.sidebar.selectbox("Select Maintenance Type", ['All'] + store.options('Maintenance Type'))
+    filters = {column: None if value == 'All' else value for column, value in
+               [('Ship', selected_ship), ('Component', selected_component), ('Status', selected_status),
+                ('Maintenance Type', selected_type)]}
+    view_key = (tuple(filters.items()), store.version())
+    summary = view_cache.get(('summary', view_key), lambda: store.summary(filters))
     st.title("🚢 Ship Maintenance Management System")
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        total_maintenance = len(filtered_data)
-        st.metric("Total Maintenance Records", total_maintenance)
+        st.metric("Total Maintenance Records", summary['total'])
     with col2:
-        preventive_count = len(filtered_data[filtered_data['Maintenance Type'] == 'Preventive'])
-        st.metric("Preventive Maintenance", preventive_count)
+        st.metric("Preventive Maintenance", summary['preventive'])
     with col3:
-        overdue_count = len(filtered_data[filtered_data['Status'] == 'Overdue'])
-        st.metric("Overdue Maintenance", overdue_count)
+        st.metric("Overdue Maintenance", summary['overdue'])
     with col4:
-        total_cost = filtered_data['Cost ($)'].sum()
-        st.metric("Total Cost ($)", f"{total_cost:,.2f}")
+        st.metric("Total Cost ($)", f"{summary['cost']:,.2f}")
     tab1, tab2, tab3, tab4 = st.tabs(["Maintenance Records", "Preventive Schedule", "Predictive Analytics", "Add New Record"])
     with tab1:
         st.subheader("Maintenance Records")
-        st.dataframe(filtered_data.sort_values('Next Maintenance Date', ascending=False), 
-                    use_container_width=True, height=400)
+        st.dataframe(view_cache.get(('rows', view_key), lambda: store.rows(filters)),
+                     use_container_width=True, height=400)
+        type_fig, cost_fig = view_cache.get(('charts', view_key), lambda: build_maintenance_charts(summary))
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Maintenance by Type")
-            type_counts = filtered_data['Maintenance Type'].value_counts()
-            fig = px.pie(type_counts, values=type_counts.values, names=type_counts.index)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(type_fig, use_container_width=True)
         with col2:
             st.subheader("Cost Distribution by Component")
-            cost_by_component = filtered_data.groupby('Component')['Cost ($)'].sum().reset_index()
-            fig = px.bar(cost_by_component, x='Component', y='Cost ($)', color='Component')
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(cost_fig, use_container_width=True)
     with tab2:
         st.subheader("Preventive Maintenance Schedule")
         months = [calendar.month_name[i] for i in range(1, 13)]
         selected_month = st.selectbox("Select Month", months, index=datetime.now().month-1)
         month_num = months.index(selected_month) + 1
         current_year = datetime.now().year
-        preventive_data = filtered_data[filtered_data['Maintenance Type'] == 'Preventive']
-        monthly_schedule = preventive_data[
-            (preventive_data['Next Maintenance Date'].dt.month == month_num) & 
-            (preventive_data['Next Maintenance Date'].dt.year == current_year)
-        ]
-        if not monthly_schedule.empty:
-            st.dataframe(monthly_schedule.sort_values('Next Maintenance Date'), 
-                        use_container_width=True, height=400)
-            fig = px.timeline(
-                monthly_schedule, 
-                x_start="Last Maintenance Date", 
-                x_end="Next Maintenance Date", 
-                y="Component",
-                color="Ship",
-                title="Maintenance Schedule Timeline"
-            )
+        monthly_schedule, fig = view_cache.get(('schedule', view_key, current_year, month_num),
+                                               lambda: build_preventive_schedule(store, filters, current_year, month_num))
+        if monthly_schedule is not None:
+            st.dataframe(monthly_schedule, use_container_width=True, height=400)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No preventive maintenance scheduled for the selected month.")
     with tab3:
         st.subheader("Predictive Maintenance Analytics")
-        alert_data = st.session_state.sensor_data[st.session_state.sensor_data['Alert'] == True]
-        if not alert_data.empty:
-            st.warning(f"⚠️ {len(alert_data)} active alerts detected!")
-            st.dataframe(alert_data.sort_values('Timestamp', ascending=False), 
-                        use_container_width=True, height=300)
-            selected_component_alert = st.selectbox(
-                "Select Component for Analysis", 
-                alert_data['Component'].unique()
-            )
-            component_data = st.session_state.sensor_data[
-                st.session_state.sensor_data['Component'] == selected_component_alert
-            ]
-            fig = px.line(
-                component_data, 
-                x='Timestamp', 
-                y='Value', 
-                color='Parameter',
-                title=f"Sensor Data for {selected_component_alert}",
-                markers=True
-            )
-            for parameter in component_data['Parameter'].unique():
-                threshold = component_data[component_data['Parameter'] == parameter]['Threshold'].iloc[0]
-                fig.add_hline(
-                    y=threshold, 
-                    line_dash="dot",
-                    annotation_text=f"{parameter} Threshold",
-                    annotation_position="bottom right",
-                    line_color="red"
+
+        @st.fragment(run_every=2)
+        def show_sensor_alerts():
+            alert_data = sensor_stream.alert_frame()
+            channels = sensor_stream.stats_frame()
+            active = int(channels['Alert'].sum()) if not channels.empty else 0
+            if active:
+                st.warning(f"⚠️ {active} active alerts detected!")
+            else:
+                st.success("No active alerts detected. All systems operating within normal parameters.")
+            with st.expander(f"Sensor channels ({sensor_stream.readings} readings)"):
+                st.dataframe(channels, use_container_width=True, hide_index=True)
+            if not alert_data.empty:
+                st.caption(f"Alert history: last {len(alert_data)} readings over threshold or with the EWMA over it")
+                st.dataframe(alert_data, use_container_width=True, height=300)
+                selected_component_alert = st.selectbox(
+                    "Select Component for Analysis", 
+                    alert_data['Component'].unique(),
+                    key="sensor_component"
                 )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.success("No active alerts detected. All systems operating within normal parameters.")
+                component_data = sensor_stream.history(selected_component_alert)
+                fig = px.line(
+                    component_data, 
+                    x='Timestamp', 
+                    y='Value', 
+                    color='Parameter',
+                    title=f"Sensor Data for {selected_component_alert}",
+                    markers=True
+                )
+                for parameter in component_data['Parameter'].unique():
+                    fig.add_hline(
+                        y=SENSOR_PARAMETERS[parameter][2], 
+                        line_dash="dot",
+                        annotation_text=f"{parameter} Threshold",
+                        annotation_position="bottom right",
+                        line_color="red"
+                    )
+                st.plotly_chart(fig, use_container_width=True)
+        show_sensor_alerts()
     with tab4:
         st.subheader("Add New Maintenance Record")
         with st.form("maintenance_form"):
             col1, col2 = st.columns(2)
             with col1:
-                ship = st.selectbox("Ship", st.session_state.maintenance_data['Ship'].unique())
-                component = st.selectbox("Component", st.session_state.maintenance_data['Component'].unique())
-                maintenance_type = st.selectbox("Maintenance Type", st.session_state.maintenance_data['Maintenance Type'].unique())
-                status = st.selectbox("Status", st.session_state.maintenance_data['Status'].unique())
+                ship = st.selectbox("Ship", store.options('Ship'))
+                component = st.selectbox("Component", store.options('Component'))
+                maintenance_type = st.selectbox("Maintenance Type", store.options('Maintenance Type'))
+                status = st.selectbox("Status", store.options('Status'))
             with col2:
                 last_maintenance_date = st.date_input("Last Maintenance Date", datetime.now())
                 next_maintenance_date = st.date_input("Next Maintenance Date", datetime.now() + timedelta(days=30))
@@ -809,8 +2416,8 @@ def app3():
                     'Cost ($)': cost,
                     'Hours Spent': hours_spent
                 }
-                new_df = pd.DataFrame([new_record])
-                st.session_state.maintenance_data = pd.concat([st.session_state.maintenance_data, new_df], ignore_index=True)
+                store.add(new_record)
+                view_cache.invalidate()
                 st.success("Maintenance record added successfully!")
                 st.rerun()
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -0,0 +1,107 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = ("- The ballast pump must be inspected weekly (Source: manual.pdf, chunk 3).\n"
+                  "- Fire drills are held monthly (Source: safety.docx, chunk 1).")
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    answer = DEFAULT_ANSWER
+    first_token_delay = 0.2
+    token_delay = 0.02
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.split('?')[0].endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        tokens = [token + ' ' for token in self.answer.split(' ')]
+        tokens[-1] = tokens[-1].rstrip()
+        if request.get('stream'):
+            self._stream(request, tokens)
+        else:
+            time.sleep(self.first_token_delay + self.token_delay * len(tokens))
+            self._send_json({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get('model', 'gpt-4o'),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.answer},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            })
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, request, tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(tokens):
+            self._write_event({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get('model', 'gpt-4o'),
+                "choices": [{"index": 0, "delta": {"content": token},
+                             "finish_reason": "stop" if i == len(tokens) - 1 else None}]
+            })
+            time.sleep(self.token_delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, payload):
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients that drop keep-alive connections are expected, not errors
+        pass
+
+
+def start_mock_server(host='127.0.0.1', port=0):
+    server = MockOpenAIServer((host, port), MockOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--first-token-delay", type=float, default=MockOpenAIHandler.first_token_delay)
+    parser.add_argument("--token-delay", type=float, default=MockOpenAIHandler.token_delay)
+    args = parser.parse_args()
+    MockOpenAIHandler.first_token_delay = args.first_token_delay
+    MockOpenAIHandler.token_delay = args.token_delay
+    server = MockOpenAIServer((args.host, args.port), MockOpenAIHandler)
+    print(f"Mock Azure OpenAI endpoint: http://{args.host}:{args.port}")
+    server.serve_forever()